@@ -2,13 +2,16 @@
 # Imports
 # ----------------------------------------------------------------------------#
 from flask import Flask
-from flask_moment import Moment
 from config import Config
-import logging
-from logging.handlers import RotatingFileHandler
 import os
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from jinja2 import FileSystemBytecodeCache
+from app.assets import Assets
+from app.cache import PageCache
+from app.compress import Compress
+from app.database import Database
+from app.log import RequestLogging
+from app.metrics import RequestMetrics
+from app.profiler import RequestProfiler
 # from flask_wtf import CSRFProtect
 
 
@@ -18,29 +21,33 @@ from flask_migrate import Migrate
 
 # csrf = CSRFProtect()
 app = Flask(__name__)
-moment = Moment(app)
 app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+logs = RequestLogging(app)
+db = Database(app)
+# Flask-Migrate pulls in alembic, which only the flask command needs
+if os.environ.get('FLASK_RUN_FROM_CLI'):
+    from flask_migrate import Migrate
+    migrate = Migrate(app, db)
+if app.config['TEMPLATE_BYTECODE_CACHE']:
+    # compiled templates survive restarts; `flask precompile` fills it
+    if app.config['TEMPLATE_CACHE_DIR']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+        app.config['TEMPLATE_CACHE_DIR'], 'fyyur-%s.cache')
+assets = Assets(app)
+cache = PageCache(app)
+metrics = RequestMetrics(app)
+metrics.watch()
+profiler = RequestProfiler(app)
+# after_request handlers run last to first: registered after the metrics,
+# compression is counted in the request time
+compress = Compress(app)
 # csrf.init_app(app)
 
-from app import routes, models
-
-if not os.path.exists("logs"):
-    os.mkdir("logs")
-file_handler = RotatingFileHandler(
-    "logs/error.log", maxBytes=10240, backupCount=10
-)
-file_handler.setFormatter(
-    logging.Formatter(
-        "%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]"
-    )
-)
-file_handler.setLevel(logging.INFO)
-app.logger.addHandler(file_handler)
-
-app.logger.setLevel(logging.INFO)
-app.logger.info("Fyyur")
+from app import routes, models, counters, cli, api
+
+cache.watch(db, (models.Artist, models.Venue, models.Show))
+
 # Default port:
 # if __name__ == '__main__':
 #     app.run()
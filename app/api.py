@@ -0,0 +1,206 @@
+'''Read-only JSON API, version 1.
+
+    GET /api/v1/<artists|venues|shows>
+    GET /api/v1/<artists|venues|shows>/<id>
+
+Listings are filtered and paged exactly like the pages, through the same
+queries and keyset cursors (?genre=, ?after=, ?before=, ?per_page=);
+shows take the calendar filters of /shows (?from=, ?to=, ?artist_id=,
+?venue_id=, ?city=).
+Every endpoint also takes:
+
+    ?fields=id,name         only these fields of each record; columns that
+                            are not asked for are not even selected
+    ?embed=upcoming_shows   related records, fetched with one query per
+                            relation for the whole page
+
+Responses are compact JSON built straight from the rows, with no template
+rendering.
+'''
+import json
+from datetime import datetime
+from functools import wraps
+from flask import request
+from sqlalchemy.orm import load_only, selectinload
+from werkzeug.exceptions import BadRequest, HTTPException
+from app import app, cache
+from app.conditional import conditional
+from app.models import Artist, Venue, Show
+from app.pagination import keyset_paginate
+from app.queries import LISTING_KEYS, with_genre, detail_validators, \
+    calendar_args, in_calendar
+
+API_PREFIX = '/api/v1'
+MODELS = {'artists': Artist, 'venues': Venue, 'shows': Show}
+# fields of a record embedded in another one
+SUMMARY_FIELDS = {
+    Artist: ('id', 'name', 'image_link'),
+    Venue: ('id', 'name', 'city', 'state', 'image_link'),
+    Show: ('id', 'artist_id', 'venue_id', 'start_time'),
+}
+VALIDATORS = {
+    'artists': detail_validators(Artist, Show.artist_id, Venue,
+                                 Show.venue_id),
+    'venues': detail_validators(Venue, Show.venue_id, Artist,
+                                Show.artist_id),
+}
+
+
+def field_names(model):
+    names = [column.key for column in model.__table__.columns]
+    if hasattr(model, 'genres'):
+        names.append('genres')
+    return names
+
+
+FIELDS = {model: field_names(model) for model in MODELS.values()}
+
+
+def serialize(obj, fields):
+    record = {}
+    for name in fields:
+        value = getattr(obj, name)
+        if name == 'genres':
+            value = [genre.name for genre in value]
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        record[name] = value
+    return record
+
+
+#  ----------------------------------------------------------------
+#  Embeds
+#  ----------------------------------------------------------------
+def upcoming_shows(show_fk):
+    '''embeds the upcoming shows of each artist or venue'''
+    def load(records):
+        by_owner = {record.id: [] for record in records}
+        shows = Show.query.options(load_only(*SUMMARY_FIELDS[Show])).filter(
+            show_fk.in_(list(by_owner)),
+            Show.start_time > datetime.now()).order_by(
+            show_fk, Show.start_time)
+        for show in shows:
+            by_owner[getattr(show, show_fk.key)].append(
+                serialize(show, SUMMARY_FIELDS[Show]))
+        return [by_owner[record.id] for record in records]
+    return load, ()
+
+
+def parent(model, fk):
+    '''embeds the artist or venue of each show'''
+    def load(shows):
+        ids = {getattr(show, fk) for show in shows}
+        parents = {row.id: serialize(row, SUMMARY_FIELDS[model])
+                   for row in model.query.options(
+                       load_only(*SUMMARY_FIELDS[model])).filter(
+                       model.id.in_(ids))} if ids else {}
+        return [parents.get(getattr(show, fk)) for show in shows]
+    return load, (fk,)
+
+
+# name -> (loader, columns the loader reads from each record)
+EMBEDS = {
+    Artist: {'upcoming_shows': upcoming_shows(Show.artist_id)},
+    Venue: {'upcoming_shows': upcoming_shows(Show.venue_id)},
+    Show: {'artist': parent(Artist, 'artist_id'),
+           'venue': parent(Venue, 'venue_id')},
+}
+
+
+#  ----------------------------------------------------------------
+#  Request handling
+#  ----------------------------------------------------------------
+def names_arg(name, allowed, default):
+    value = request.args.get(name)
+    if value is None:
+        return list(default)
+    names = [part.strip() for part in value.split(',') if part.strip()]
+    unknown = [part for part in names if part not in allowed]
+    if unknown:
+        raise BadRequest(f'unknown {name}: {", ".join(unknown)}')
+    return list(dict.fromkeys(names))
+
+
+def record_query(model, fields, embeds):
+    '''model.query loading only what fields, embeds and paging need'''
+    columns = {column.key for column in LISTING_KEYS[model]} | {'id'}
+    columns.update(name for name in fields if name != 'genres')
+    for name in embeds:
+        columns.update(EMBEDS[model][name][1])
+    options = [load_only(*columns)]
+    if 'genres' in fields:
+        options.append(selectinload(model.genres))
+    return model.query.options(*options)
+
+
+def render(model, records, fields, embeds):
+    data = [serialize(record, fields) for record in records]
+    for name in embeds:
+        load = EMBEDS[model][name][0]
+        for item, value in zip(data, load(records) if records else []):
+            item[name] = value
+    return data
+
+
+def json_response(payload, status=200):
+    '''minified JSON, even when DEBUG makes jsonify pretty-print'''
+    return app.response_class(
+        json.dumps(payload, separators=(',', ':')), status=status,
+        mimetype='application/json')
+
+
+def json_errors(f):
+    '''answers errors in JSON rather than with the HTML error pages'''
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            return f(*args, **kwargs)
+        except HTTPException as e:
+            return json_response({'error': e.description}, e.code)
+    return decorated_function
+
+
+def api_validators(kind, id):
+    validators = VALIDATORS.get(kind)
+    return validators(id=id) if validators is not None else None
+
+
+#  ----------------------------------------------------------------
+#  Endpoints
+#  ----------------------------------------------------------------
+@app.route(API_PREFIX + '/<any(artists, venues, shows):kind>')
+@json_errors
+@cache.cached()
+def api_list(kind):
+    '''one page of artists, venues or shows'''
+    model = MODELS[kind]
+    fields = names_arg('fields', FIELDS[model], FIELDS[model])
+    embeds = names_arg('embed', EMBEDS[model], ())
+    query = record_query(model, fields, embeds)
+    if model is Show:
+        try:
+            query = in_calendar(query, **calendar_args(request.args))
+        except ValueError:
+            raise BadRequest('from, to, artist_id and venue_id must be '
+                             'dates and ids')
+    else:
+        query = with_genre(query, model, request.args.get('genre'))
+    page = keyset_paginate(query, LISTING_KEYS[model])
+    prev_url, next_url = page.urls('api_list', kind=kind)
+    return json_response({'data': render(model, page.items, fields, embeds),
+                          'prev': prev_url, 'next': next_url})
+
+
+@app.route(API_PREFIX + '/<any(artists, venues, shows):kind>/<int:id>')
+@json_errors
+@conditional(api_validators)
+@cache.cached()
+def api_detail(kind, id):
+    '''a single artist, venue or show'''
+    model = MODELS[kind]
+    fields = names_arg('fields', FIELDS[model], FIELDS[model])
+    embeds = names_arg('embed', EMBEDS[model], ())
+    record = record_query(model, fields, embeds).filter(
+        model.id == id).first_or_404()
+    (data,) = render(model, [record], fields, embeds)
+    return json_response({'data': data})
@@ -0,0 +1,268 @@
+'''Static asset pipeline: bundles, fingerprints and precompresses the
+files under app/static for ``flask assets build``, and serves the result.
+
+The CSS and JS of the layout are concatenated into the BUNDLES, with
+CSS minified and JS minified when rjsmin is installed. Every output file,
+bundle or plain static file, is written to static/dist under a name
+holding a hash of its content, next to .gz and, when the brotli package
+is installed, .br copies of the text ones. dist/manifest.json maps each
+logical name to its file, and templates ask for ``asset_url(name)`` or
+``asset_urls(bundle)`` rather than hard-coding paths.
+
+Fingerprinted files never change, so they are served with a one-year
+immutable Cache-Control, and with the precompressed copy the client
+accepts. Without a manifest, as in development before a build, the
+helpers point at the source files, which are served as usual. A build
+keeps the files of earlier builds, so pages rendered before a deploy
+still load; ``flask assets clean`` removes the ones no manifest lists.
+'''
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import tempfile
+from flask import request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+OUTPUT = 'dist'
+MANIFEST = 'manifest.json'
+# bundle name -> its source files, in load order
+BUNDLES = {
+    'main.css': ['css/bootstrap.min.css', 'css/layout.main.css',
+                 'css/main.css', 'css/main.responsive.css',
+                 'css/main.quickfix.css'],
+    # run in the head, before the page is parsed
+    'head.js': ['js/libs/modernizr-2.8.2.min.js', 'js/libs/moment.min.js'],
+    # deferred, after jQuery
+    'main.js': ['js/script.js', 'js/libs/bootstrap-3.1.1.min.js',
+                'js/plugins.js'],
+}
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.eot',
+                '.ttf', '.otf', '.ico')
+# variants tried in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|'''
+                        r'''(/\*.*?\*/)''', re.S)
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+
+def squeeze_css(text):
+    text = re.sub(r'\s+', ' ', text)
+    # a space before ':' can be a descendant combinator, so it stays
+    text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+    return text.replace(': ', ':').replace(';}', '}')
+
+
+def minify_css(text):
+    '''drops comments, other than /*! licences, and needless whitespace
+    outside strings'''
+    pieces, pending, last = [], [], 0
+    for match in CSS_TOKENS.finditer(text):
+        pending.append(text[last:match.start()])
+        string, comment = match.groups()
+        if string or comment.startswith('/*!'):
+            pieces.append(squeeze_css(''.join(pending)))
+            pieces.append(match.group())
+            pending = []
+        last = match.end()
+    pending.append(text[last:])
+    pieces.append(squeeze_css(''.join(pending)))
+    return ''.join(pieces).strip()
+
+
+def minify_js(text):
+    return rjsmin.jsmin(text) if rjsmin is not None else text
+
+
+def rebase_css(text, source, target):
+    '''rewrites the relative url()s of a stylesheet moved from the path
+    source to the path target, both relative to the static folder'''
+    def rebase(match):
+        quote, url = match.groups()
+        if re.match(r'^([a-z]+:|/|#|data:)', url):
+            return match.group()
+        absolute = posixpath.normpath(posixpath.join(
+            posixpath.dirname(source), url))
+        return 'url({0}{1}{0})'.format(quote, posixpath.relpath(
+            absolute, posixpath.dirname(target) or '.'))
+    return CSS_URL.sub(rebase, text)
+
+
+def fingerprinted(name, content):
+    '''dist/<dir>/<stem>.<hash><ext> for the file name'''
+    stem, ext = posixpath.splitext(name)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return posixpath.join(OUTPUT, f'{stem}.{digest}{ext}')
+
+
+def write_atomic(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    # mkstemp makes the file private, but a front server may serve it
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def compressed(content):
+    '''(encoding, suffix, bytes) of each precompressed variant worth
+    keeping'''
+    variants = [('gzip', '.gz', gzip.compress(content, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('br', '.br', brotli.compress(content, quality=11)))
+    return [(encoding, suffix, data) for encoding, suffix, data in variants
+            if len(data) < len(content) * 0.9]
+
+
+def bundle(static_folder, name, sources):
+    '''the minified concatenation of sources'''
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_folder, source), 'rb') as f:
+            text = f.read().decode('utf-8')
+        minified = '.min.' in posixpath.basename(source)
+        if name.endswith('.css'):
+            text = rebase_css(text, source, posixpath.join(OUTPUT, name))
+            parts.append(text if minified else minify_css(text))
+        else:
+            parts.append(text if minified else minify_js(text))
+    # keeps a script without a final semicolon from running into the next
+    separator = '\n' if name.endswith('.css') else '\n;\n'
+    return separator.join(parts).encode('utf-8')
+
+
+def source_files(static_folder):
+    '''every static file that is not build output, as relative paths'''
+    for directory, dirs, files in os.walk(static_folder):
+        relative = os.path.relpath(directory, static_folder)
+        if relative == '.':
+            dirs[:] = [name for name in dirs if name != OUTPUT]
+        for name in files:
+            if not name.startswith('.'):
+                yield posixpath.normpath(posixpath.join(
+                    relative.replace(os.sep, '/'), name))
+
+
+def build(static_folder):
+    '''writes every bundle and static file under its fingerprinted name,
+    with its compressed variants, then the manifest; returns the
+    manifest'''
+    outputs = {name: bundle(static_folder, name, sources)
+               for name, sources in BUNDLES.items()}
+    for name in source_files(static_folder):
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            outputs[name] = f.read()
+
+    manifest = {'files': {}, 'encodings': {}}
+    for name, content in sorted(outputs.items()):
+        path = fingerprinted(name, content)
+        manifest['files'][name] = path
+        target = os.path.join(static_folder, path)
+        if not os.path.exists(target):
+            write_atomic(target, content)
+        if not name.endswith(COMPRESSIBLE):
+            continue
+        variants = compressed(content)
+        for encoding, suffix, data in variants:
+            if not os.path.exists(target + suffix):
+                write_atomic(target + suffix, data)
+        if variants:
+            manifest['encodings'][path] = [
+                encoding for encoding, _, _ in variants]
+    write_atomic(os.path.join(static_folder, OUTPUT, MANIFEST),
+                 json.dumps(manifest, indent=1, sort_keys=True).encode())
+    return manifest
+
+
+def clean(static_folder, manifest):
+    '''removes built files the manifest does not list; returns how many'''
+    keep = {MANIFEST}
+    for path in manifest['files'].values():
+        keep.add(path)
+        for encoding, suffix in ENCODINGS:
+            keep.add(path + suffix)
+    removed = 0
+    output = os.path.join(static_folder, OUTPUT)
+    for name in list(source_files(output)):
+        if posixpath.join(OUTPUT, name) not in keep and name not in keep:
+            os.remove(os.path.join(output, name))
+            removed += 1
+    return removed
+
+
+class Assets(object):
+    '''template helpers and static file serving for the built assets'''
+
+    def __init__(self, app=None):
+        self.manifest = {'files': {}, 'encodings': {}}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.load()
+        app.jinja_env.globals.update(asset_url=self.url,
+                                     asset_urls=self.urls)
+        app.view_functions['static'] = self.send_static
+
+    def load(self):
+        '''reads the manifest of the last build, if there is one'''
+        path = os.path.join(self.app.static_folder, OUTPUT, MANIFEST)
+        try:
+            with open(path) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {'files': {}, 'encodings': {}}
+        self.immutable = set(self.manifest['files'].values())
+
+    def url(self, name):
+        '''the url of a static file, fingerprinted once built'''
+        return url_for('static',
+                       filename=self.manifest['files'].get(name, name))
+
+    def urls(self, name):
+        '''the urls that load a bundle: the bundle once built, else its
+        sources'''
+        if name in self.manifest['files'] or name not in BUNDLES:
+            return [self.url(name)]
+        return [url_for('static', filename=source)
+                for source in BUNDLES[name]]
+
+    def send_static(self, filename):
+        '''sends a static file, its precompressed variant when the client
+        takes it, and caches fingerprinted files for good'''
+        immutable = filename in self.immutable
+        cache_timeout = IMMUTABLE_MAX_AGE if immutable else \
+            self.app.get_send_file_max_age(filename)
+        available = self.manifest['encodings'].get(filename, ())
+        for encoding, suffix in ENCODINGS:
+            if encoding in available and request.accept_encodings[encoding]:
+                response = send_from_directory(
+                    self.app.static_folder, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0],
+                    cache_timeout=cache_timeout)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(
+                self.app.static_folder, filename, cache_timeout=cache_timeout)
+        if available:
+            response.vary.add('Accept-Encoding')
+        if immutable:
+            response.headers['Cache-Control'] = \
+                f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return response
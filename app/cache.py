@@ -0,0 +1,214 @@
+'''Server-side page cache for the read-heavy GET views.
+
+Rendered responses are stored under their full path by one of two backends
+that need no external service: ``memory`` (a per-process LRU with a TTL)
+or ``filesystem`` (a directory shared by every worker on the host).
+``null`` disables caching. Any commit that touches an Artist, Venue or Show
+clears the whole cache, since the listing pages depend on all of them.
+The flask commands that write, like ``import`` and ``counters``, can only
+clear the workers' pages through a ``filesystem`` cache; with ``memory``
+they warn that the pages stay until CACHE_DEFAULT_TIMEOUT.
+'''
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session
+from sqlalchemy import event
+from app.database import pinned_to_primary
+
+
+class NullCache(object):
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def clear(self):
+        pass
+
+
+class MemoryCache(object):
+    '''thread-safe LRU holding at most threshold entries, each of which
+    expires timeout seconds after it was stored'''
+
+    def __init__(self, threshold=500):
+        self.threshold = threshold
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.time() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.threshold:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileSystemCache(object):
+    '''one pickle file per entry in directory, holding at most threshold
+    files; writes go through a temporary file so readers never see a
+    partial entry'''
+
+    def __init__(self, directory, threshold=500):
+        self.directory = directory
+        self.threshold = threshold
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(
+            self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def _files(self):
+        return [os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if not name.startswith('.')]
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError):
+            return None
+        if expires < time.time():
+            return None
+        return value
+
+    def set(self, key, value, timeout):
+        self._prune()
+        fd, tmp = tempfile.mkstemp(prefix='.', dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((time.time() + timeout, value), f,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+
+    def _prune(self):
+        files = self._files()
+        if len(files) < self.threshold:
+            return
+        files.sort(key=lambda path: os.path.getmtime(path))
+        for path in files[:len(files) - self.threshold + 1]:
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        for path in self._files():
+            self._remove(path)
+
+
+class PageCache(object):
+    '''caches whole GET responses and counts hits, misses and
+    invalidations'''
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_TYPE', 'memory')
+        app.config.setdefault('CACHE_DEFAULT_TIMEOUT', 60)
+        app.config.setdefault('CACHE_THRESHOLD', 500)
+        app.config.setdefault('CACHE_DIR', None)
+        self.default_timeout = app.config['CACHE_DEFAULT_TIMEOUT']
+        kind = app.config['CACHE_TYPE']
+        threshold = app.config['CACHE_THRESHOLD']
+        if kind == 'memory':
+            self.backend = MemoryCache(threshold)
+        elif kind == 'filesystem':
+            self.backend = FileSystemCache(
+                app.config['CACHE_DIR'] or os.path.join(
+                    app.instance_path, 'page-cache'), threshold)
+        elif kind == 'null':
+            self.backend = NullCache()
+        else:
+            raise ValueError(f'unknown CACHE_TYPE {kind!r}')
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def clear(self):
+        self.backend.clear()
+        self.count('invalidations')
+
+    def cached(self, timeout=None):
+        '''caches the view's successful responses under the request path.
+        Requests with pending flash messages bypass the cache, because the
+        page would render (and consume) messages meant for one user, and
+        so do visitors pinned to the primary after a write, because the
+        cached page may have been read from a lagging replica.'''
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if request.method != 'GET' or '_flashes' in session or \
+                        pinned_to_primary():
+                    return f(*args, **kwargs)
+                key = 'view:' + request.full_path
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.count('hits')
+                    body, status, headers = entry
+                    return body, status, headers + [('X-Cache', 'HIT')]
+                self.count('misses')
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    self.backend.set(
+                        key, (response.get_data(), response.status_code,
+                              [('Content-Type', response.content_type)]),
+                        timeout or self.default_timeout)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return decorated_function
+        return decorator
+
+    def watch(self, db, models):
+        '''clears the cache after every commit that wrote one of models'''
+        models = tuple(models)
+
+        @event.listens_for(db.session, 'after_flush')
+        def mark_dirty(session, flush_context):
+            for obj in session.new | session.dirty | session.deleted:
+                if isinstance(obj, models):
+                    session.info['page_cache_dirty'] = True
+                    return
+
+        @event.listens_for(db.session, 'after_bulk_update')
+        @event.listens_for(db.session, 'after_bulk_delete')
+        def mark_bulk_dirty(context):
+            if issubclass(context.mapper.class_, models):
+                context.session.info['page_cache_dirty'] = True
+
+        @event.listens_for(db.session, 'after_commit')
+        def invalidate(session):
+            if session.info.pop('page_cache_dirty', False):
+                self.clear()
+
@@ -0,0 +1,236 @@
+import collections
+import io
+import json
+import os
+import sys
+import time
+import click
+from app import app, assets, cache, counters, db, importer, profiler
+from app import export as exports
+from app import seed as fake
+from app import search as search_index
+from app.assets import BUNDLES, ENCODINGS, build, clean
+from app.models import Artist, Genre, Venue
+from app.profiler import profile_paths
+
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+
+
+def clear_page_cache():
+    '''clears the page cache after a write from the command line. Only a
+    filesystem cache is shared with the web workers; a memory cache lives
+    in each worker, so clearing this process's copy leaves theirs stale.'''
+    cache.clear()
+    if app.config['CACHE_TYPE'] == 'memory':
+        click.echo('warning: with CACHE_TYPE=memory the web workers keep '
+                   'their cached pages for up to CACHE_DEFAULT_TIMEOUT '
+                   'seconds; set CACHE_TYPE=filesystem to clear them from '
+                   'the command line.', err=True)
+
+
+@app.cli.group()
+def search():
+    """Full-text search index commands."""
+    pass
+
+
+@search.command()
+def reindex():
+    """Rebuild the search index from the artist and venue tables."""
+    with db.engine.begin() as connection:
+        search_index.reindex(connection)
+    click.echo('Search index rebuilt.')
+
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(importer.IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'format', type=click.Choice(sorted(
+    importer.READERS)), help='File format; defaults to the extension.')
+@click.option('--chunk-size', default=1000, show_default=True,
+              help='Rows inserted per transaction.')
+@click.option('--rejects', type=click.File('w'),
+              help='Write rejected rows to this JSONL file.')
+def import_(kind, path, format, chunk_size, rejects):
+    """Import artists, venues or shows from a CSV or JSONL file."""
+    format = format or os.path.splitext(path)[1].lstrip('.').lower()
+    if format not in importer.READERS:
+        raise click.BadParameter(f'cannot tell the format of {path}; '
+                                 'pass --format', param_hint='path')
+    started = time.perf_counter()
+
+    def rate(stats):
+        return stats['read'] / max(time.perf_counter() - started, 1e-9)
+
+    def on_reject(line, values, error):
+        click.echo(f'line {line}: {error}', err=True)
+        if rejects is not None:
+            rejects.write(json.dumps(
+                {'line': line, 'error': error, 'row': values}) + '\n')
+
+    def on_chunk(stats):
+        click.echo(f'{stats["imported"]} imported, {stats["rejected"]} '
+                   f'rejected, {rate(stats):.0f} rows/s')
+
+    with open(path, newline='', encoding='utf-8') as f:
+        try:
+            stats = importer.IMPORTERS[kind]().run(
+                importer.READERS[format](f), chunk_size,
+                on_reject=on_reject, on_chunk=on_chunk)
+        except importer.ImportFailed as e:
+            raise click.ClickException(
+                f'import stopped at {e}; earlier chunks were committed')
+        finally:
+            clear_page_cache()
+    click.echo(f'Imported {stats["imported"]} of {stats["read"]} {kind} in '
+               f'{time.perf_counter() - started:.1f}s '
+               f'({rate(stats):.0f} rows/s); {stats["rejected"]} rejected.')
+
+
+@app.cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(exports.QUERIES)))
+@click.option('--format', 'format', type=click.Choice(sorted(
+    exports.FORMATS)), help='Output format; CSV for shows, else JSONL.')
+@click.option('--from', 'start', type=click.DateTime(DATE_FORMATS),
+              help='Only shows starting at or after this time.')
+@click.option('--to', 'end', type=click.DateTime(DATE_FORMATS),
+              help='Only shows starting before this time.')
+@click.option('--output', '-o', type=click.File('w'), default='-',
+              help='File to write; defaults to stdout.')
+def export(kind, format, start, end, output):
+    """Export artists, venues or shows as CSV or JSONL."""
+    format = format or exports.DEFAULT_FORMATS[kind]
+    fieldnames, rows = exports.export_rows(kind, start, end)
+    for chunk in exports.FORMATS[format](fieldnames, rows):
+        output.write(chunk)
+
+
+@app.cli.command()
+@click.option('--artists', default=1000, show_default=True)
+@click.option('--venues', default=200, show_default=True)
+@click.option('--shows', default=20000, show_default=True)
+@click.option('--seed', 'seed_value', default=0, show_default=True,
+              help='Random seed; the same seed gives the same data.')
+def seed(artists, venues, shows, seed_value):
+    """Fill an empty database with a synthetic catalogue."""
+    if any(db.session.query(model.query.exists()).scalar()
+           for model in (Genre, Artist, Venue)):
+        raise click.ClickException('the database is not empty')
+    started = time.perf_counter()
+
+    def progress(table, rows):
+        click.echo(f'{table}: {rows} rows')
+
+    fake.seed(artists, venues, shows, seed_value, progress=progress)
+    click.echo(f'Seeded {artists} artists, {venues} venues and {shows} '
+               f'shows in {time.perf_counter() - started:.1f}s.')
+
+
+@app.cli.group()
+def profile():
+    """Request profile commands."""
+    pass
+
+
+@profile.command()
+@click.option('--endpoint', help='Only profiles of this endpoint.')
+@click.option('--sort', type=click.Choice(['cumulative', 'tottime', 'calls']),
+              default='cumulative', show_default=True)
+@click.option('--limit', default=25, show_default=True,
+              help='Number of functions to list.')
+def summarize(endpoint, sort, limit):
+    """Merge the saved profiles and list the hottest functions."""
+    import pstats
+    paths = profile_paths(profiler.directory(app), endpoint)
+    if not paths:
+        raise click.ClickException(
+            f'no profiles in {profiler.directory(app)}')
+    counts = collections.Counter(
+        os.path.basename(path).split('.', 1)[0] for path in paths)
+    click.echo(f'{len(paths)} profiles: ' + ', '.join(
+        f'{name} {count}' for name, count in counts.most_common()))
+    output = io.StringIO()
+    pstats.Stats(*paths, stream=output).sort_stats(sort).print_stats(limit)
+    click.echo(output.getvalue())
+
+
+@app.cli.group('counters')
+def counters_group():
+    """Artist and venue show counter commands."""
+    pass
+
+
+@counters_group.command('roll-forward')
+def roll_forward():
+    """Move shows that have started from upcoming to past."""
+    with db.engine.begin() as connection:
+        updated = counters.roll_forward(connection)
+    if updated:
+        clear_page_cache()
+    click.echo(f'Rolled forward {updated} artists and venues.')
+
+
+@counters_group.command()
+@click.option('--fix', is_flag=True, help='Recount the rows that drifted.')
+def reconcile(fix):
+    """Check the stored show counters against the shows."""
+    drifted = 0
+    with db.engine.begin() as connection:
+        for model in counters.PARENTS:
+            ids = []
+            for id, stored, actual in counters.drift(connection, model):
+                click.echo(f'{model.__name__} {id}: stored {stored}, '
+                           f'actual {actual}')
+                ids.append(id)
+            if fix:
+                counters.recount(connection, model, ids)
+            drifted += len(ids)
+    if fix and drifted:
+        clear_page_cache()
+    click.echo(f'{drifted} rows drifted' + (', recounted.' if fix and drifted
+                                           else '.'))
+    if drifted and not fix:
+        sys.exit(1)
+
+
+@app.cli.command()
+def precompile():
+    """Compile every template into the bytecode cache."""
+    if app.jinja_env.bytecode_cache is None:
+        raise click.ClickException('the template bytecode cache is off')
+    started = time.perf_counter()
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    click.echo(f'Compiled {len(names)} templates in '
+               f'{time.perf_counter() - started:.2f}s.')
+
+
+@app.cli.group('assets')
+def assets_group():
+    """Static asset pipeline commands."""
+    pass
+
+
+@assets_group.command('build')
+def build_assets():
+    """Bundle, fingerprint and precompress the static files."""
+    started = time.perf_counter()
+    manifest = build(app.static_folder)
+    assets.load()
+    for name in BUNDLES:
+        path = os.path.join(app.static_folder, manifest['files'][name])
+        sizes = [f'{os.path.getsize(path)} bytes'] + [
+            f'{encoding} {os.path.getsize(path + suffix)}'
+            for encoding, suffix in ENCODINGS
+            if os.path.exists(path + suffix)]
+        click.echo(f'{manifest["files"][name]}: {", ".join(sizes)}')
+    click.echo(f'Built {len(manifest["files"])} assets in '
+               f'{time.perf_counter() - started:.2f}s.')
+
+
+@assets_group.command('clean')
+def clean_assets():
+    """Remove built files that the current manifest does not list."""
+    removed = clean(app.static_folder, assets.manifest)
+    click.echo(f'Removed {removed} files.')
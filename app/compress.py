@@ -0,0 +1,93 @@
+'''gzip compression of responses, for running without a reverse proxy
+that would do it.
+
+A response is compressed when the client accepts gzip, its type is in
+COMPRESS_MIMETYPES and its body is at least COMPRESS_MIN_SIZE bytes.
+Streamed responses, such as exports and calendar feeds, are compressed
+chunk by chunk as they are generated, each chunk flushed so the client
+receives it at once. Files from the static view are left alone, since
+the asset pipeline sends them precompressed. A compressed response keeps
+its ETag as a weak one, so conditional requests still match it; the
+pages of app/conditional.py send weak ETags to begin with, so their 304s
+carry the same ETag as the 200 either way.
+'''
+import zlib
+from flask import request
+
+MIMETYPES = ('text/html', 'text/css', 'text/plain', 'text/csv',
+             'text/calendar', 'text/javascript', 'application/javascript',
+             'application/json', 'application/x-ndjson', 'image/svg+xml')
+# zlib's wbits for a gzip header and trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def gzip_body(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+
+def gzip_stream(chunks, level):
+    '''compresses an iterable of chunks, flushing after each non-empty
+    one'''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + \
+                    compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+class Compress(object):
+    '''gzips eligible responses in an after_request handler'''
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_MIMETYPES', MIMETYPES)
+        app.config.setdefault('COMPRESS_STREAMS', True)
+        self.config = app.config
+        app.after_request(self.compress)
+
+    def compress(self, response):
+        config = self.config
+        if not config['COMPRESS_ENABLED'] or \
+                response.mimetype not in config['COMPRESS_MIMETYPES'] or \
+                response.direct_passthrough or \
+                not 200 <= response.status_code < 300 or \
+                response.status_code in (204, 206) or \
+                'Content-Encoding' in response.headers:
+            return response
+        response.vary.add('Accept-Encoding')
+        if not request.accept_encodings['gzip'] or request.method == 'HEAD':
+            return response
+
+        level = config['COMPRESS_LEVEL']
+        if response.is_streamed:
+            if not config['COMPRESS_STREAMS']:
+                return response
+            response.response = gzip_stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESS_MIN_SIZE']:
+                return response
+            compressed = gzip_body(data, level)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        etag, weak = response.get_etag()
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        return response
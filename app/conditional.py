@@ -0,0 +1,46 @@
+'''Conditional GET support: answers If-None-Match / If-Modified-Since with
+304 Not Modified before the view (and its queries) runs.'''
+import hashlib
+from functools import wraps
+from flask import current_app, request, session
+from werkzeug.http import is_resource_modified
+
+
+def make_etag(values):
+    raw = '|'.join(str(value) for value in values)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def conditional(validators):
+    '''validators(**view_args) cheaply returns (last_modified, values) for
+    the page, where values is everything the page depends on and becomes
+    the ETag, or None if the page should always be rendered (e.g. the
+    record does not exist). last_modified is a naive UTC datetime, or None
+    to validate by ETag alone.'''
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # pending flash messages make the page specific to one visitor
+            if request.method != 'GET' or '_flashes' in session:
+                return f(*args, **kwargs)
+            validated = validators(*args, **kwargs)
+            if validated is None:
+                return f(*args, **kwargs)
+            last_modified, values = validated
+            etag = make_etag(values)
+            if not is_resource_modified(request.environ, etag=etag,
+                                        last_modified=last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # weak, as app/compress.py makes the ETag of a gzipped 200;
+            # a 304 cannot tell whether its 200 would have been gzipped
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,198 @@
+'''Denormalized show counters on Artist and Venue.
+
+Each artist and venue stores upcoming_shows_count, past_shows_count and
+next_show_at, so listings and search results read their counts without
+touching Show. Shows created, deleted or rescheduled through the session
+adjust the counters of their artist and venue in the same flush, by
+delta, so a write costs O(1) whatever the catalogue size. Bulk loads
+bypass the session and recount the rows they touched instead.
+
+Time moves shows from upcoming to past without any write, which is what
+next_show_at is for: ``flask counters roll-forward``, run from cron every
+few minutes, recounts just the rows whose next show has started.
+Between runs a show that has just started still counts as upcoming.
+``flask counters reconcile`` checks the stored counters against Show.
+'''
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import and_, bindparam, case, event, func, or_, select
+from sqlalchemy.orm import attributes
+from app import db
+from app.models import Artist, Venue, Show
+
+# parent model -> the Show column pointing at it
+PARENTS = {Artist: Show.__table__.c.artist_id,
+           Venue: Show.__table__.c.venue_id}
+COUNTED = ('artist_id', 'venue_id', 'start_time')
+
+
+def actual_counts(model, now):
+    '''correlated subqueries of the true counters of model, each an index
+    range scan on (fk, start_time)'''
+    shows = Show.__table__
+    fk = PARENTS[model]
+    table = model.__table__
+
+    def scalar(column, *where):
+        return select([column]).where(
+            and_(fk == table.c.id, *where)).as_scalar()
+    return {
+        'upcoming_shows_count': scalar(
+            func.count(), shows.c.start_time > now),
+        'past_shows_count': scalar(func.count(), shows.c.start_time <= now),
+        'next_show_at': scalar(
+            func.min(shows.c.start_time), shows.c.start_time > now),
+    }
+
+
+def recount(connection, model, ids=None, now=None):
+    '''recomputes the counters of model rows ids, or of every row'''
+    table = model.__table__
+    statement = table.update().values(
+        **actual_counts(model, now or datetime.now()))
+    if ids is not None:
+        ids = list(ids)
+        if not ids:
+            return 0
+        statement = statement.where(table.c.id.in_(ids))
+    return connection.execute(statement).rowcount
+
+
+def roll_forward(connection, now=None):
+    '''recounts the rows whose next show has started since they were last
+    counted and returns how many there were'''
+    now = now or datetime.now()
+    updated = 0
+    for model in PARENTS:
+        table = model.__table__
+        updated += connection.execute(table.update().where(
+            table.c.next_show_at <= now).values(
+            **actual_counts(model, now))).rowcount
+    return updated
+
+
+def drift(connection, model, now=None):
+    '''rows of model whose stored counters differ from the real ones, as
+    (id, stored, actual) triples; rows only waiting for a roll-forward
+    are not drift'''
+    now = now or datetime.now()
+    shows = Show.__table__
+    fk = PARENTS[model]
+    table = model.__table__
+    upcoming = shows.c.start_time > now
+    real = select([
+        fk.label('id'),
+        func.count(case([(upcoming, 1)])).label('upcoming'),
+        func.count(case([(~upcoming, 1)])).label('past'),
+        func.min(case([(upcoming, shows.c.start_time)])).label('next')]
+    ).group_by(fk).alias('real')
+    real_upcoming = func.coalesce(real.c.upcoming, 0)
+    real_past = func.coalesce(real.c.past, 0)
+    differs = or_(
+        table.c.upcoming_shows_count != real_upcoming,
+        table.c.past_shows_count != real_past,
+        and_(table.c.next_show_at.is_(None), real.c.next.isnot(None)),
+        and_(table.c.next_show_at.isnot(None), real.c.next.is_(None)),
+        table.c.next_show_at != real.c.next)
+    current = or_(table.c.next_show_at.is_(None),
+                  table.c.next_show_at > now)
+    query = select([
+        table.c.id, table.c.upcoming_shows_count, table.c.past_shows_count,
+        table.c.next_show_at, real_upcoming, real_past, real.c.next
+    ]).select_from(table.outerjoin(real, real.c.id == table.c.id)).where(
+        and_(current, differs)).order_by(table.c.id)
+    for row in connection.execute(query):
+        yield row[0], tuple(row[1:4]), tuple(row[4:7])
+
+
+#  ----------------------------------------------------------------
+#  Incremental maintenance
+#  ----------------------------------------------------------------
+def show_values(show, current=True):
+    '''(artist_id, venue_id, start_time) of show after the flush, or
+    before it when current is False'''
+    values = []
+    for key in COUNTED:
+        history = attributes.get_history(show, key)
+        if current:
+            value = (history.added or history.unchanged or [None])[0]
+        else:
+            value = (history.deleted or history.unchanged or [None])[0]
+        values.append(value)
+    return values
+
+
+@event.listens_for(db.session, 'after_flush')
+def count_show_changes(session, flush_context):
+    '''turns the flushed shows into counter deltas for their artists and
+    venues'''
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Show):
+            changes.append((show_values(obj), 1))
+    for obj in session.deleted:
+        if isinstance(obj, Show):
+            changes.append((show_values(obj, current=False), -1))
+    for obj in session.dirty:
+        if isinstance(obj, Show) and any(
+                attributes.get_history(obj, key).has_changes()
+                for key in COUNTED):
+            changes.append((show_values(obj, current=False), -1))
+            changes.append((show_values(obj), 1))
+    if not changes:
+        return
+
+    now = datetime.now()
+    deltas = {model: defaultdict(lambda: [0, 0]) for model in PARENTS}
+    earliest = {model: {} for model in PARENTS}
+    recheck = {model: set() for model in PARENTS}
+    for (artist_id, venue_id, start_time), sign in changes:
+        if start_time is None:
+            continue
+        upcoming = start_time > now
+        for model, id in ((Artist, artist_id), (Venue, venue_id)):
+            if id is None:
+                continue
+            deltas[model][id][0 if upcoming else 1] += sign
+            if upcoming and sign > 0:
+                earliest[model][id] = min(
+                    start_time, earliest[model].get(id, start_time))
+            elif upcoming:
+                recheck[model].add(id)
+
+    connection = session.connection()
+    for model in PARENTS:
+        apply_deltas(connection, model, deltas[model], earliest[model],
+                     recheck[model], now)
+
+
+def apply_deltas(connection, model, deltas, earliest, recheck, now):
+    table = model.__table__
+    changed = [{'row_id': id, 'upcoming': upcoming, 'past': past}
+               for id, (upcoming, past) in deltas.items()
+               if upcoming or past]
+    if changed:
+        connection.execute(table.update().where(
+            table.c.id == bindparam('row_id')).values(
+            upcoming_shows_count=table.c.upcoming_shows_count +
+            bindparam('upcoming'),
+            past_shows_count=table.c.past_shows_count + bindparam('past')),
+            changed)
+    # a new upcoming show can only bring next_show_at forward...
+    sooner = [{'row_id': id, 'start': start}
+              for id, start in earliest.items() if id not in recheck]
+    if sooner:
+        start = bindparam('start', type_=db.DateTime)
+        connection.execute(table.update().where(
+            table.c.id == bindparam('row_id')).values(next_show_at=case([(
+                or_(table.c.next_show_at.is_(None),
+                    table.c.next_show_at > start), start)],
+                else_=table.c.next_show_at)), sooner)
+    # ...but removing one may have removed the next show itself
+    if recheck:
+        shows = Show.__table__
+        fk = PARENTS[model]
+        connection.execute(table.update().where(
+            table.c.id.in_(list(recheck))).values(next_show_at=select([
+                func.min(shows.c.start_time)]).where(and_(
+                    fk == table.c.id, shows.c.start_time > now)).as_scalar()))
@@ -0,0 +1,134 @@
+'''Engine settings and read-replica routing for Flask-SQLAlchemy.
+
+Server databases get a sized, recycled and pre-pinged pool from the
+DATABASE_POOL_* settings, while SQLite keeps the pool Flask-SQLAlchemy
+picks for it. DATABASE_STATEMENT_TIMEOUT_MS cancels any statement that
+runs longer than that. On Postgres it is the statement_timeout of every
+connection, on MySQL the max_execution_time, and on SQLite a progress
+handler.
+
+With a ``replica`` bind in SQLALCHEMY_BINDS, the session of a GET or
+HEAD request reads from the replica. Everything else uses the primary:
+other methods, the CLI, a session once it has flushed, and a visitor's
+requests for DATABASE_REPLICA_PIN_SECONDS after they wrote, so they see
+their own changes despite replication lag.
+'''
+import time
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+
+REPLICA = 'replica'
+READ_METHODS = ('GET', 'HEAD')
+
+
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.reads_from_replica():
+            return self.db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+    def reads_from_replica(self):
+        if self._flushing or self.info.get('wrote') or \
+                not has_request_context() or \
+                request.method not in READ_METHODS or \
+                REPLICA not in (self.app.config['SQLALCHEMY_BINDS'] or ()):
+            return False
+        return not pinned_to_primary()
+
+
+def pinned_to_primary():
+    '''whether the visitor wrote recently enough to read from the primary,
+    and so must not be given pages read from the replica'''
+    return session.get('read_primary_until', 0) >= time.time()
+
+
+class Database(SQLAlchemy):
+    '''SQLAlchemy with pool settings from the config, statement timeouts
+    and a session that sends reads to the replica'''
+
+    def init_app(self, app):
+        app.config.setdefault('DATABASE_POOL_SIZE', 5)
+        app.config.setdefault('DATABASE_MAX_OVERFLOW', 10)
+        app.config.setdefault('DATABASE_POOL_TIMEOUT', 30)
+        app.config.setdefault('DATABASE_POOL_RECYCLE', 1800)
+        app.config.setdefault('DATABASE_POOL_PRE_PING', True)
+        app.config.setdefault('DATABASE_STATEMENT_TIMEOUT_MS', None)
+        app.config.setdefault('DATABASE_REPLICA_PIN_SECONDS', 5)
+        super().init_app(app)
+        app.after_request(self.pin_writer)
+
+    def create_session(self, options):
+        factory = orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+        @event.listens_for(factory, 'after_flush')
+        def mark_written(session, flush_context):
+            session.info['wrote'] = True
+
+        @event.listens_for(factory, 'after_commit')
+        def note_commit(session):
+            if session.info.get('wrote') and has_request_context():
+                g.database_wrote = True
+        return factory
+
+    def pin_writer(self, response):
+        '''keeps a visitor who just wrote on the primary for a while'''
+        if g.pop('database_wrote', False) and \
+                REPLICA in (self.get_app().config['SQLALCHEMY_BINDS'] or ()):
+            session['read_primary_until'] = time.time() + \
+                self.get_app().config['DATABASE_REPLICA_PIN_SECONDS']
+        return response
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        super().apply_driver_hacks(app, sa_url, options)
+        config = app.config
+        options.setdefault('pool_pre_ping', config['DATABASE_POOL_PRE_PING'])
+        if sa_url.drivername.startswith('sqlite'):
+            return
+        for option, key in (('pool_size', 'DATABASE_POOL_SIZE'),
+                            ('max_overflow', 'DATABASE_MAX_OVERFLOW'),
+                            ('pool_timeout', 'DATABASE_POOL_TIMEOUT'),
+                            ('pool_recycle', 'DATABASE_POOL_RECYCLE')):
+            if config[key] is not None:
+                options.setdefault(option, config[key])
+        timeout = config['DATABASE_STATEMENT_TIMEOUT_MS']
+        if timeout:
+            connect_args = options.setdefault('connect_args', {})
+            if sa_url.drivername.startswith('postgresql'):
+                connect_args['options'] = \
+                    f'-c statement_timeout={int(timeout)}'
+            elif sa_url.drivername.startswith('mysql'):
+                connect_args['init_command'] = \
+                    f'SET SESSION max_execution_time={int(timeout)}'
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        timeout = self.get_app().config['DATABASE_STATEMENT_TIMEOUT_MS']
+        if timeout and sa_url.drivername.startswith('sqlite'):
+            interrupt_slow_statements(engine, timeout / 1000)
+        return engine
+
+
+def interrupt_slow_statements(engine, seconds):
+    '''makes SQLite abort a statement that runs longer than seconds with
+    an OperationalError; fetching its rows afterwards is not limited'''
+    @event.listens_for(engine, 'connect')
+    def set_progress_handler(dbapi_connection, connection_record):
+        deadline = connection_record.info['deadline'] = [None]
+
+        def interrupt():
+            return deadline[0] is not None and time.monotonic() > deadline[0]
+        # called every this many virtual machine instructions
+        dbapi_connection.set_progress_handler(interrupt, 10000)
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start(conn, cursor, statement, *args):
+        conn.info['deadline'][0] = time.monotonic() + seconds
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def finish(conn, cursor, statement, *args):
+        conn.info['deadline'][0] = None
@@ -1,7 +1,5 @@
 from app import app
 from flask import render_template
-import logging
-from logging import Formatter, FileHandler
 
 
 @app.errorhandler(404)
@@ -13,14 +11,3 @@ def not_found_error(error):
 def server_error(error):
     return render_template('errors/500.html'), 500
 
-
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter(
-            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
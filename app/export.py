@@ -0,0 +1,117 @@
+'''Streaming export of the catalogue as CSV or JSONL.
+
+Rows are read with yield_per, which on Postgres uses a server-side
+cursor, and serialized into chunks as they arrive, so neither the rows
+nor the output are ever held in memory whole. The columns match what
+``flask import`` reads, so an export can be loaded into another
+database as it is.
+'''
+import csv
+import io
+import json
+from sqlalchemy import func
+from app import db
+from app.models import Artist, Genre, Venue, Show
+from app.queries import in_range
+
+# rows fetched per round trip and serialized per chunk of output
+BATCH_SIZE = 1000
+DEFAULT_FORMATS = {'shows': 'csv', 'artists': 'jsonl', 'venues': 'jsonl'}
+# maintained by the app rather than part of the catalogue
+DERIVED = ('updated_at', 'upcoming_shows_count', 'past_shows_count',
+           'next_show_at')
+
+
+def genre_names(model):
+    '''correlated subquery of the comma separated genres of model'''
+    link = model.genres.property.secondary
+    (fk,) = [column for column in link.c if column.name != 'genre_id']
+    aggregate = func.string_agg \
+        if db.session.get_bind().dialect.name == 'postgresql' \
+        else func.group_concat
+    return db.session.query(aggregate(Genre.name, ',')).join(
+        link, link.c.genre_id == Genre.id).filter(
+        fk == model.id).as_scalar()
+
+
+def catalogue_query(model, show_fk, start=None, end=None):
+    '''every column of model but the derived ones, plus its genres; with
+    a date range, only rows with a show in it'''
+    columns = [column for column in model.__table__.columns
+               if column.key not in DERIVED]
+    query = db.session.query(
+        *columns, genre_names(model).label('genres')).order_by(model.id)
+    if start is not None or end is not None:
+        query = query.filter(model.id.in_(
+            in_range(db.session.query(show_fk), start, end)))
+    return query
+
+
+def shows_query(start=None, end=None):
+    return in_range(db.session.query(
+        Show.id, Show.artist_id, Artist.name.label('artist_name'),
+        Show.venue_id, Venue.name.label('venue_name'), Show.start_time).join(
+        Artist, Artist.id == Show.artist_id).join(
+        Venue, Venue.id == Show.venue_id).order_by(
+        Show.start_time, Show.id), start, end)
+
+
+QUERIES = {
+    'artists': lambda start, end: catalogue_query(
+        Artist, Show.artist_id, start, end),
+    'venues': lambda start, end: catalogue_query(
+        Venue, Show.venue_id, start, end),
+    'shows': shows_query,
+}
+
+
+def export_rows(kind, start=None, end=None):
+    '''returns the field names and a generator of dicts for kind'''
+    query = QUERIES[kind](start, end)
+    fieldnames = [column['name'] for column in query.column_descriptions]
+
+    def rows():
+        for row in query.yield_per(BATCH_SIZE):
+            values = row._asdict()
+            if 'genres' in values:
+                values['genres'] = sorted(
+                    values['genres'].split(',')) if values['genres'] else []
+            yield values
+    return fieldnames, rows()
+
+
+def value_text(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(' ', 'seconds')
+    return value
+
+
+def to_csv(fieldnames, rows):
+    '''yields a CSV file a batch of rows at a time'''
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames)
+    writer.writeheader()
+    for count, values in enumerate(rows, 1):
+        writer.writerow({
+            key: ','.join(value) if isinstance(value, list)
+            else value_text(value) for key, value in values.items()})
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def to_jsonl(fieldnames, rows):
+    '''yields a JSON lines file a batch of rows at a time'''
+    lines = []
+    for values in rows:
+        lines.append(json.dumps(values, default=value_text) + '\n')
+        if len(lines) == BATCH_SIZE:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+FORMATS = {'csv': to_csv, 'jsonl': to_jsonl}
+MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
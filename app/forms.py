@@ -2,14 +2,21 @@ from datetime import datetime
 from flask_wtf import FlaskForm
 from wtforms import StringField, SelectField, \
     SelectMultipleField, DateTimeField, SubmitField, \
-    BooleanField, FieldList
-from wtforms.validators import DataRequired, URL
+    BooleanField, FieldList, DateField, IntegerField
+from wtforms.validators import DataRequired, URL, NumberRange, Optional
 
 
 class ShowForm(FlaskForm):
     artist_id = StringField('artist_id')
     venue_id = StringField('venue_id')
     start_time = DateTimeField('start_time')
+    # a residency: the same show every interval weeks or months
+    repeat = SelectField('repeat', choices=[
+        ('', 'Does not repeat'), ('weekly', 'Weekly'), ('monthly', 'Monthly')
+    ], default='')
+    interval = IntegerField('interval', default=1,
+                            validators=[Optional(), NumberRange(min=1)])
+    repeat_until = DateField('repeat_until', validators=[Optional()])
     submit = SubmitField('submit')
 
 
@@ -0,0 +1,89 @@
+'''iCalendar (RFC 5545) feeds of the shows of an artist or a venue.
+
+A feed is generated as it is sent: the shows are read with yield_per and
+written out a batch at a time, so a long-running artist costs no more
+memory than a new one. Show times are stored as the local time of the
+venue, so they are written as floating times, which calendar apps show
+unchanged whatever the subscriber's time zone.
+'''
+from datetime import datetime
+from app import db
+from app.export import BATCH_SIZE
+from app.models import Artist, Venue, Show
+from app.queries import in_calendar
+
+PRODID = '-//Fyyur//Shows//EN'
+# longest content line, in octets, before it is folded
+LINE_OCTETS = 75
+
+
+def escape(text):
+    '''escapes a TEXT value'''
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(
+        ',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n')
+
+
+def fold(line):
+    '''a content line with its CRLF, folded into pieces of at most 75
+    octets without splitting a UTF-8 sequence'''
+    encoded = line.encode('utf-8')
+    pieces = []
+    limit = LINE_OCTETS
+    while len(encoded) > limit:
+        cut = limit
+        # continuation bytes are 10xxxxxx
+        while encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        pieces.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        # continuation lines start with a space, which counts
+        limit = LINE_OCTETS - 1
+    pieces.append(encoded.decode('utf-8'))
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def floating(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def feed_query(**filters):
+    '''the shows matching filters, in start order, with what their events
+    need from the artist and venue'''
+    return in_calendar(db.session.query(
+        Show.id, Show.start_time, Show.updated_at, Show.artist_id,
+        Artist.name.label('artist_name'), Venue.name.label('venue_name'),
+        Venue.address, Venue.city, Venue.state).join(
+        Artist, Artist.id == Show.artist_id).join(
+        Venue, Venue.id == Show.venue_id), **filters).order_by(
+        Show.start_time, Show.id)
+
+
+def event(show, domain, url_root):
+    location = ', '.join(part for part in (
+        show.venue_name, show.address, show.city, show.state) if part)
+    stamp = show.updated_at or datetime.utcnow()
+    return ''.join(fold(line) for line in (
+        'BEGIN:VEVENT',
+        f'UID:show-{show.id}@{domain}',
+        f'DTSTAMP:{floating(stamp)}Z',
+        f'DTSTART:{floating(show.start_time)}',
+        f'SUMMARY:{escape(show.artist_name)} at {escape(show.venue_name)}',
+        f'LOCATION:{escape(location)}',
+        f'URL:{url_root}artists/{show.artist_id}',
+        'END:VEVENT'))
+
+
+def to_ical(name, query, domain, url_root):
+    '''yields a calendar named name of the shows of query, a batch of
+    events at a time'''
+    yield ''.join(fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN', 'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape(name)}'))
+    events = []
+    for show in query.yield_per(BATCH_SIZE):
+        events.append(event(show, domain, url_root))
+        if len(events) == BATCH_SIZE:
+            yield ''.join(events)
+            events = []
+    yield ''.join(events) + fold('END:VCALENDAR')
@@ -0,0 +1,316 @@
+'''Bulk import of artists, venues and shows from CSV or JSONL files.
+
+Rows are streamed from the file and validated by the same WTForms classes
+as the create pages. Valid rows are inserted a chunk at a time, and each
+chunk is one transaction of executemany INSERTs covering the rows, their
+genre links and their search index entries. Only the current chunk is
+held in memory, so the size of the file does not matter. Rows that fail
+validation are reported with their line number and skipped.
+
+An optional ``id`` column keeps the promoter's own ids, so a shows file
+can refer to the artists and venues imported before it. CSV files list
+genres comma separated in a single ``genres`` column.
+'''
+import csv
+import itertools
+import json
+from sqlalchemy import func, text
+from werkzeug.datastructures import MultiDict
+from app import db
+from app import counters, search
+from app.models import Artist, Venue, Show, Genre
+
+FALSE_VALUES = ('', '0', 'false', 'f', 'n', 'no', 'off')
+
+
+class ImportFailed(Exception):
+    '''a chunk could not be written; every earlier chunk is committed'''
+
+    def __init__(self, line, error):
+        super().__init__(f'line {line}: {error}')
+        self.line = line
+
+
+def read_csv(f):
+    '''yields (line, values, error) for each row of a CSV file with a
+    header row'''
+    reader = csv.DictReader(f)
+    for values in reader:
+        yield reader.line_num, values, None
+
+
+def read_jsonl(f):
+    '''yields (line, values, error) for each object of a JSON lines file'''
+    for line, raw in enumerate(f, 1):
+        if not raw.strip():
+            continue
+        try:
+            values = json.loads(raw)
+        except ValueError as e:
+            yield line, None, f'invalid JSON: {e}'
+            continue
+        if not isinstance(values, dict):
+            yield line, None, 'expected a JSON object'
+            continue
+        yield line, values, None
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def errors_text(errors):
+    return '; '.join(f'{field}: {" ".join(messages)}'
+                     for field, messages in errors.items())
+
+
+class Importer(object):
+    '''validates rows with the form of app.forms named form_name and
+    inserts them into model'''
+    model = None
+    form_name = None
+
+    def __init__(self):
+        # WTForms is loaded by the first import, not by starting the app
+        from wtforms import BooleanField
+        from app import forms
+        # one form is re-processed for every row, which is far cheaper
+        # than building a new one each time
+        self.form = getattr(forms, self.form_name)(meta={'csrf': False})
+        self.columns = set(self.model.__table__.columns.keys())
+        self.booleans = {name for name, field in self.form._fields.items()
+                         if isinstance(field, BooleanField)}
+        self.explicit_ids = False
+
+    def formdata(self, values):
+        data = MultiDict()
+        for key, value in values.items():
+            if value is None or key not in self.form._fields:
+                continue
+            if key in self.booleans:
+                value = '' if str(value).strip().lower() in FALSE_VALUES \
+                    else 'y'
+            if isinstance(value, (list, tuple)):
+                for item in value:
+                    data.add(key, str(item).strip())
+            else:
+                data.add(key, str(value))
+        return data
+
+    def clean(self, values):
+        '''returns (record, error) for one row of the file'''
+        form = self.form
+        form.process(self.formdata(values))
+        if not form.validate():
+            return None, errors_text(form.errors)
+        record = {name: field.data for name, field in form._fields.items()
+                  if name in self.columns and name != 'id'}
+        if values.get('id') not in (None, ''):
+            try:
+                record['id'] = int(values['id'])
+            except (TypeError, ValueError):
+                return None, 'id: Not a valid integer value.'
+            self.explicit_ids = True
+        return record, None
+
+    def insert(self, records):
+        db.session.bulk_insert_mappings(self.model, records)
+
+    def finish(self):
+        '''runs once after the last chunk'''
+        if self.explicit_ids:
+            reset_sequence(self.model)
+
+    def run(self, rows, chunk_size=1000, on_reject=None, on_chunk=None):
+        '''imports rows, an iterable of (line, values, error), and returns
+        a dict of how many rows were read, imported and rejected'''
+        stats = {'read': 0, 'imported': 0, 'rejected': 0}
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            valid = []
+            for line, values, error in chunk:
+                stats['read'] += 1
+                if error is None:
+                    record, error = self.clean(values)
+                if error is None:
+                    valid.append((line, values, record))
+                else:
+                    self.reject(stats, on_reject, line, values, error)
+            records = []
+            errors = self.check([record for _, _, record in valid])
+            for (line, values, record), error in zip(valid, errors):
+                if error is None:
+                    records.append(record)
+                else:
+                    self.reject(stats, on_reject, line, values, error)
+            try:
+                if records:
+                    self.insert(records)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                raise ImportFailed(chunk[0][0], e) from e
+            stats['imported'] += len(records)
+            if on_chunk is not None:
+                on_chunk(stats)
+        self.finish()
+        db.session.commit()
+        return stats
+
+    def reject(self, stats, on_reject, line, values, error):
+        stats['rejected'] += 1
+        if on_reject is not None:
+            on_reject(line, values, error)
+
+    def check(self, records):
+        '''returns an error, or None, for each of a chunk's records, for
+        rows the form accepts but the database would not'''
+        return [None] * len(records)
+
+
+class GenreImporter(Importer):
+    '''also writes the genre links and search index entries of each row'''
+    link = None
+
+    def __init__(self):
+        super().__init__()
+        # genre name -> id; there are only ever a few dozen genres
+        self.genre_ids = {}
+        self.fk = [column.name for column in self.link.c
+                   if column.name != 'genre_id'][0]
+
+    def clean(self, values):
+        # a CSV row names its genres comma separated in one column
+        genres = values.get('genres')
+        if isinstance(genres, str):
+            values = dict(values, genres=genres.split(','))
+        record, error = super().clean(values)
+        if record is not None:
+            record['genres'] = list(dict.fromkeys(self.form.genres.data))
+        return record, error
+
+    def lookup_genres(self, names):
+        missing = set(names) - set(self.genre_ids)
+        if not missing:
+            return
+        self.genre_ids.update(db.session.query(Genre.name, Genre.id).filter(
+            Genre.name.in_(missing)))
+        new = [{'name': name}
+               for name in sorted(missing - set(self.genre_ids))]
+        if new:
+            db.session.bulk_insert_mappings(Genre, new, return_defaults=True)
+            self.genre_ids.update((row['name'], row['id']) for row in new)
+
+    def insert(self, records):
+        genres = [record.pop('genres') for record in records]
+        # the genre links need the new ids, so they are handed out before
+        # the INSERT rather than read back one row at a time
+        missing = [record for record in records if 'id' not in record]
+        new_ids = allocate_ids(self.model, len(missing), [
+            record['id'] for record in records if 'id' in record])
+        for record, id in zip(missing, new_ids):
+            record['id'] = id
+        connection = db.session.connection()
+        connection.execute(self.model.__table__.insert(), records)
+        self.lookup_genres(set(itertools.chain.from_iterable(genres)))
+        connection.execute(self.link.insert(), [
+            {self.fk: record['id'], 'genre_id': self.genre_ids[name]}
+            for record, names in zip(records, genres) for name in names])
+        search.write_documents(connection, self.model, [
+            dict({field: record.get(field) or ''
+                  for field in search.INDEXED_FIELDS},
+                 id=record['id'], genres=' '.join(names))
+            for record, names in zip(records, genres)])
+
+    def run(self, *args, **kwargs):
+        try:
+            return super().run(*args, **kwargs)
+        except ImportFailed:
+            # genres created by the failed chunk were rolled back with it
+            self.genre_ids.clear()
+            raise
+
+
+class ArtistImporter(GenreImporter):
+    model = Artist
+    form_name = 'ArtistForm'
+    link = Artist.genres.property.secondary
+
+
+class VenueImporter(GenreImporter):
+    model = Venue
+    form_name = 'VenueForm'
+    link = Venue.genres.property.secondary
+
+
+class ShowImporter(Importer):
+    model = Show
+    form_name = 'ShowForm'
+
+    def clean(self, values):
+        record, error = super().clean(values)
+        if record is None:
+            return record, error
+        try:
+            record['artist_id'] = int(record['artist_id'])
+            record['venue_id'] = int(record['venue_id'])
+        except (TypeError, ValueError):
+            return None, 'artist_id and venue_id must be integers'
+        return record, None
+
+    def check(self, records):
+        # one query per table finds every dangling reference in the chunk
+        artists = existing_ids(Artist, {r['artist_id'] for r in records})
+        venues = existing_ids(Venue, {r['venue_id'] for r in records})
+        return [f'artist_id: No artist {r["artist_id"]}.'
+                if r['artist_id'] not in artists else
+                f'venue_id: No venue {r["venue_id"]}.'
+                if r['venue_id'] not in venues else None
+                for r in records]
+
+    def insert(self, records):
+        super().insert(records)
+        # bulk inserts skip the session hook that keeps the counters
+        connection = db.session.connection()
+        counters.recount(connection, Artist, {r['artist_id'] for r in records})
+        counters.recount(connection, Venue, {r['venue_id'] for r in records})
+
+
+def existing_ids(model, ids):
+    if not ids:
+        return set()
+    return {id for (id,) in db.session.query(model.id).filter(
+        model.id.in_(ids))}
+
+
+def allocate_ids(model, count, taken=()):
+    '''count unused ids for new rows of model: drawn from the id sequence
+    on Postgres, else counted on from the highest id in the table or in
+    taken'''
+    if not count:
+        return []
+    table = model.__tablename__
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return [id for (id,) in db.session.execute(text(
+            f"SELECT nextval(pg_get_serial_sequence('\"{table}\"', 'id')) "
+            'FROM generate_series(1, :count)'), {'count': count})]
+    highest = max([db.session.query(func.max(model.id)).scalar() or 0] +
+                  list(taken))
+    return list(range(highest + 1, highest + 1 + count))
+
+
+def reset_sequence(model):
+    '''moves a Postgres id sequence past ids that were inserted
+    explicitly'''
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    table = model.__tablename__
+    db.session.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+        f'coalesce(max(id), 1)) FROM "{table}"'))
+
+
+IMPORTERS = {'artists': ArtistImporter, 'venues': VenueImporter,
+             'shows': ShowImporter}
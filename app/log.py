@@ -0,0 +1,144 @@
+'''Logging that keeps disk writes off the request threads.
+
+The app logger has a single QueueHandler, which only puts records on an
+in-memory queue. A QueueListener thread takes them off and writes them,
+one JSON object per line, to LOG_FILE. The file is rotated at
+LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files. With LOG_FILE set to
+``-`` the lines go to stderr instead. Run several worker processes with
+one file each, or with ``-`` and a collector, since processes rotating
+the same file would lose lines.
+
+Every request gets an id, taken from the X-Request-ID header of the
+request when a proxy set one, or made up otherwise. It is sent back in
+the X-Request-ID header of the response and added to every line logged
+while the request is handled, so the lines of one request can be found
+together.
+'''
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# what is kept of an incoming id; anything else gets a new one
+REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+
+class JSONFormatter(logging.Formatter):
+    '''a record as a line of JSON; a message that is itself a JSON object,
+    like the request lines of the metrics, is merged into it'''
+
+    def format(self, record):
+        message = record.getMessage()
+        line = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', None),
+        }
+        fields = None
+        if message.startswith('{'):
+            try:
+                fields = json.loads(message)
+            except ValueError:
+                pass
+        if isinstance(fields, dict):
+            line.update(fields)
+        else:
+            line['message'] = message
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line['exception'] = record.exc_text
+            line['source'] = f'{record.pathname}:{record.lineno}'
+        return json.dumps(line, default=str)
+
+
+class RequestIdFilter(logging.Filter):
+    '''adds the id of the current request to a record, on the thread that
+    logs it'''
+
+    def filter(self, record):
+        record.request_id = g.get('request_id') \
+            if has_request_context() else None
+        return True
+
+
+class LocalQueueHandler(QueueHandler):
+    def prepare(self, record):
+        '''renders the message and traceback now, while the arguments are
+        as logged, but leaves the formatting to the listener'''
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class RequestLogging(object):
+    '''the app logger's queue, its writer thread and the request ids'''
+
+    def __init__(self, app=None):
+        self.listener = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOG_FILE', 'logs/fyyur.log')
+        app.config.setdefault('LOG_LEVEL', 'INFO')
+        app.config.setdefault('LOG_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('LOG_BACKUP_COUNT', 10)
+
+        records = queue.SimpleQueue()
+        queue_handler = LocalQueueHandler(records)
+        queue_handler.addFilter(RequestIdFilter())
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(queue_handler)
+        app.logger.setLevel(app.config['LOG_LEVEL'])
+
+        self.listener = QueueListener(records, self.handler(app.config),
+                                      respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+        app.before_request(self.assign_request_id)
+        app.after_request(self.send_request_id)
+
+    def handler(self, config):
+        path = config['LOG_FILE']
+        if path == '-':
+            handler = logging.StreamHandler(sys.stderr)
+        else:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            handler = RotatingFileHandler(
+                path, maxBytes=config['LOG_MAX_BYTES'],
+                backupCount=config['LOG_BACKUP_COUNT'], encoding='utf-8',
+                delay=True)
+        handler.setFormatter(JSONFormatter())
+        return handler
+
+    def stop(self):
+        '''writes out the queued records and stops the writer thread'''
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+    def assign_request_id(self):
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        g.request_id = incoming if REQUEST_ID.match(incoming) \
+            else uuid.uuid4().hex
+
+    def send_request_id(self, response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
@@ -0,0 +1,195 @@
+'''Per-request instrumentation: SQL query count and time, the slowest
+statement, template render time and total time.
+
+Each request gets a ``Server-Timing`` header and one JSON log line, and
+the figures are aggregated per endpoint for ``/metrics`` in the
+Prometheus text format. Aggregates live in the process, so each worker
+reports its own. For streamed responses only the work done before the
+first chunk is counted.
+'''
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from flask import before_render_template, g, has_request_context, \
+    request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                    5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+WHITESPACE = re.compile(r'\s+')
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket', dict(labels, le=str(bound)), cumulative
+        yield f'{name}_bucket', dict(labels, le='+Inf'), self.count
+        yield f'{name}_sum', labels, self.sum
+        yield f'{name}_count', labels, self.count
+
+
+class EndpointStats(object):
+    def __init__(self):
+        self.responses = defaultdict(int)
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+METRICS = [
+    ('fyyur_requests_total', 'counter', 'Requests by method and status.'),
+    ('fyyur_request_duration_seconds', 'histogram',
+     'Time spent handling requests.'),
+    ('fyyur_db_queries_per_request', 'histogram',
+     'SQL statements executed per request.'),
+    ('fyyur_db_seconds_total', 'counter', 'Time spent in SQL statements.'),
+    ('fyyur_render_seconds_total', 'counter',
+     'Time spent rendering templates.'),
+]
+
+
+def label_text(labels):
+    return ','.join('{}="{}"'.format(
+        key, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for key, value in labels.items())
+
+
+class RequestMetrics(object):
+    '''times each request and aggregates the figures per endpoint'''
+
+    def __init__(self, app=None):
+        self.endpoints = defaultdict(EndpointStats)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_MS', 500)
+        self.logger = app.logger
+        self.slow_request_ms = app.config['SLOW_REQUEST_MS']
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        before_render_template.connect(self.start_render, app)
+        template_rendered.connect(self.finish_render, app)
+
+    def watch(self):
+        '''counts and times the statements of every engine, including
+        ones created after a change of database URI'''
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def before_cursor_execute(conn, cursor, statement, *args):
+            conn.info['query_start'] = time.perf_counter()
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def after_cursor_execute(conn, cursor, statement, *args):
+            started = conn.info.pop('query_start', None)
+            if started is None or not has_request_context() or \
+                    'metrics' not in g:
+                return
+            elapsed = time.perf_counter() - started
+            metrics = g.metrics
+            metrics['queries'] += 1
+            metrics['db'] += elapsed
+            if elapsed > metrics['slowest'][0]:
+                metrics['slowest'] = (elapsed, statement)
+
+    def start(self):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'db': 0.0,
+                     'render': 0.0, 'slowest': (0.0, None)}
+
+    def start_render(self, sender, template, context, **extra):
+        if 'metrics' in g:
+            g.metrics['render_start'] = time.perf_counter()
+
+    def finish_render(self, sender, template, context, **extra):
+        if 'metrics' in g and 'render_start' in g.metrics:
+            g.metrics['render'] += \
+                time.perf_counter() - g.metrics.pop('render_start')
+
+    def finish(self, response):
+        metrics = g.pop('metrics', None)
+        if metrics is None:
+            return response
+        total = time.perf_counter() - metrics['start']
+        endpoint = request.endpoint or 'none'
+        response.headers.add('Server-Timing', ', '.join([
+            f'db;dur={metrics["db"] * 1000:.2f};'
+            f'desc="{metrics["queries"]} queries"',
+            f'render;dur={metrics["render"] * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}']))
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            stats.responses[(request.method, response.status_code)] += 1
+            stats.duration.observe(total)
+            stats.queries.observe(metrics['queries'])
+            stats.db_seconds += metrics['db']
+            stats.render_seconds += metrics['render']
+        self.log(endpoint, response, metrics, total)
+        return response
+
+    def log(self, endpoint, response, metrics, total):
+        slowest_seconds, slowest = metrics['slowest']
+        line = {
+            'event': 'request', 'method': request.method,
+            'path': request.full_path.rstrip('?'), 'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'queries': metrics['queries'],
+            'db_ms': round(metrics['db'] * 1000, 2),
+            'render_ms': round(metrics['render'] * 1000, 2),
+        }
+        if slowest is not None:
+            line['slowest_ms'] = round(slowest_seconds * 1000, 2)
+            line['slowest'] = WHITESPACE.sub(' ', slowest).strip()[:300]
+        if total * 1000 >= self.slow_request_ms:
+            self.logger.warning(json.dumps(line))
+        else:
+            self.logger.info(json.dumps(line))
+
+    def samples(self):
+        '''yields (metric, labels, value) for every series'''
+        for endpoint, stats in sorted(self.endpoints.items()):
+            labels = {'endpoint': endpoint}
+            for (method, status), count in sorted(stats.responses.items()):
+                yield 'fyyur_requests_total', dict(
+                    labels, method=method, status=status), count
+            yield from stats.duration.samples(
+                'fyyur_request_duration_seconds', labels)
+            yield from stats.queries.samples(
+                'fyyur_db_queries_per_request', labels)
+            yield 'fyyur_db_seconds_total', labels, stats.db_seconds
+            yield 'fyyur_render_seconds_total', labels, stats.render_seconds
+
+    def render(self):
+        '''every series in the Prometheus text exposition format'''
+        with self._lock:
+            samples = list(self.samples())
+        lines = []
+        for name, kind, help in METRICS:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample, labels, value in samples:
+                if sample == name or sample.startswith(name + '_') and \
+                        kind == 'histogram':
+                    lines.append(f'{sample}{{{label_text(labels)}}} {value}')
+        return '\n'.join(lines) + '\n'
@@ -1,13 +1,60 @@
 from datetime import datetime
+from sqlalchemy import event, func
 from app import db
 
 
+artist_genres = db.Table(
+    'artist_genres',
+    db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'),
+              primary_key=True),
+    db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id')
+)
+
+venue_genres = db.Table(
+    'venue_genres',
+    db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id'),
+              primary_key=True),
+    db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'),
+              primary_key=True),
+    db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id')
+)
+
+
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), index=True, unique=True, nullable=False)
+
+    @classmethod
+    def from_names(cls, names):
+        '''Genre rows for names, in order, creating any that are new'''
+        names = [name.strip() for name in names if name and name.strip()]
+        existing = {genre.name: genre for genre in
+                    cls.query.filter(cls.name.in_(names))} if names else {}
+        genres = []
+        for name in dict.fromkeys(names):
+            if name not in existing:
+                existing[name] = cls(name=name)
+            genres.append(existing[name])
+        return genres
+
+    def __repr__(self):
+        return f'<Genre: {self.id} {self.name}>'
+
+
 class Venue(db.Model):
     __tablename__ = 'Venue'
+    __table_args__ = (
+        db.Index('ix_Venue_city_state', 'city', 'state'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), index=True)
-    genres = db.Column(db.String(120), nullable=True)
+    genres = db.relationship('Genre', secondary=venue_genres,
+                             order_by='Genre.name', backref='venues')
     address = db.Column(db.String(120))
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
@@ -17,18 +64,32 @@ class Venue(db.Model):
     seeking_talent = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.String())
     image_link = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
+    # maintained by app.counters
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0')
+    next_show_at = db.Column(db.DateTime, index=True)
     shows = db.relationship('Show', backref='Venue', lazy='dynamic')
 
     def __repr__(self):
         return f'<Venue: {self.id} {self.name}>'
 
 
+# the listing's sort key, in which a missing city or state is ''
+db.Index('ix_Venue_listing', func.coalesce(Venue.city, ''),
+         func.coalesce(Venue.state, ''), Venue.id)
+
+
 class Artist(db.Model):
     __tablename__ = 'Artist'
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), index=True)
-    genres = db.Column(db.String(120), nullable=True)
+    genres = db.relationship('Genre', secondary=artist_genres,
+                             order_by='Genre.name', backref='artists')
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
@@ -37,6 +98,14 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean, default=True)
     seeking_description = db.Column(db.String())
     image_link = db.Column(db.String(500))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
+    # maintained by app.counters
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                     server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0,
+                                 server_default='0')
+    next_show_at = db.Column(db.DateTime, index=True)
     shows = db.relationship('Show', backref='Artist', lazy='dynamic')
 
     def __repr__(self):
@@ -45,11 +114,27 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'Show'
+    __table_args__ = (
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     artist_id = db.Column(db.Integer, db.ForeignKey(
         'Artist.id'), nullable=False)
     venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
     start_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow,
+                           onupdate=datetime.utcnow, index=True)
 
     def __repr__(self):
         return f'<Show: {self.artist_id} {self.venue_id} {self.start_time}>'
+
+
+@event.listens_for(db.session, 'before_flush')
+def touch_updated_at(session, flush_context, instances):
+    '''bumps updated_at on rows whose only change is to a collection, such
+    as their genres, which would not otherwise issue an UPDATE'''
+    now = datetime.utcnow()
+    for obj in session.dirty:
+        if hasattr(obj, 'updated_at') and session.is_modified(obj):
+            obj.updated_at = now
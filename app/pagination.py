@@ -0,0 +1,145 @@
+import base64
+import json
+from datetime import datetime
+from flask import abort, current_app, request, url_for
+from sqlalchemy import and_, func, literal_column, or_
+
+
+class KeysetPage(object):
+    '''one page of a keyset (seek) paginated query'''
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def urls(self, endpoint, **values):
+        '''returns (prev_url, next_url) for endpoint, keeping the other
+        query string arguments of the current request'''
+        args = {k: v for k, v in request.args.items()
+                if k not in ('after', 'before')}
+        args.update(values)
+        prev_url = url_for(endpoint, before=self.prev_cursor, **args) \
+            if self.has_prev else None
+        next_url = url_for(endpoint, after=self.next_cursor, **args) \
+            if self.has_next else None
+        return prev_url, next_url
+
+
+def encode_cursor(values):
+    '''packs the sort key of a row into an opaque url-safe token'''
+    values = [v.isoformat() if isinstance(v, datetime) else v
+              for v in values]
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, columns):
+    '''unpacks a token made by encode_cursor, raising ValueError if it
+    does not match the sort columns'''
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('malformed cursor')
+        return [decode_value(column, value)
+                for column, value in zip(columns, values)]
+    except (TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError('malformed cursor')
+
+
+def decode_value(column, value):
+    '''a cursor value as the python type of its column'''
+    python_type = column.type.python_type
+    if python_type is datetime:
+        if not isinstance(value, str):
+            raise ValueError('not a datetime')
+        return datetime.fromisoformat(value)
+    # bool is an int to isinstance, but never a sort key
+    if type(value) is bool or not isinstance(value, python_type):
+        raise ValueError(f'not a {python_type.__name__}')
+    return value
+
+
+def blank_nulls(column):
+    '''whether NULLs of column sort and seek as the empty string'''
+    return column.nullable and column.type.python_type is str
+
+
+def sort_key(column):
+    '''the expression rows are ordered and sought by; a NULL compares as
+    '' rather than in whatever place the backend gives NULLs. The ''
+    is inlined, not bound, or SQLite cannot match the expression to an
+    index on coalesce(column, '') such as ix_Venue_listing.'''
+    return func.coalesce(column, literal_column("''")) \
+        if blank_nulls(column) else column
+
+
+def row_key(row, columns):
+    values = [getattr(row, column.key) for column in columns]
+    return ['' if value is None and blank_nulls(column) else value
+            for column, value in zip(columns, values)]
+
+
+def seek(columns, values, forward=True):
+    '''builds the row-value comparison (c1, c2, ...) > (v1, v2, ...) as an
+    OR of ANDs so it can use a plain composite index on every backend'''
+    columns = [sort_key(column) for column in columns]
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        step = column > values[i] if forward else column < values[i]
+        clauses.append(and_(*(equal + [step])))
+    return or_(*clauses)
+
+
+def get_per_page():
+    '''page size from the query string, clamped to MAX_PER_PAGE'''
+    per_page = request.args.get(
+        'per_page', current_app.config['PER_PAGE'], type=int)
+    return max(1, min(per_page, current_app.config['MAX_PER_PAGE']))
+
+
+def keyset_paginate(query, columns, per_page=None):
+    '''paginates query on the unique, ascending sort key made of columns,
+    reading the after/before cursors from the request. Only per_page + 1
+    rows are ever fetched, so the cost does not depend on page depth.'''
+    per_page = per_page or get_per_page()
+    after = request.args.get('after')
+    before = request.args.get('before')
+    try:
+        if before:
+            query = query.filter(
+                seek(columns, decode_cursor(before, columns), False))
+        elif after:
+            query = query.filter(seek(columns, decode_cursor(after, columns)))
+    except ValueError:
+        abort(400)
+
+    if before:
+        rows = query.order_by(*[sort_key(c).desc() for c in columns]).limit(
+            per_page + 1).all()
+        items = rows[:per_page][::-1]
+        has_prev, has_next = len(rows) > per_page, True
+    else:
+        rows = query.order_by(*[sort_key(c) for c in columns]).limit(
+            per_page + 1).all()
+        items = rows[:per_page]
+        has_prev, has_next = bool(after), len(rows) > per_page
+
+    if not items:
+        return KeysetPage(items)
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(row_key(items[-1], columns))
+        if has_next else None,
+        prev_cursor=encode_cursor(row_key(items[0], columns))
+        if has_prev else None)
@@ -0,0 +1,85 @@
+'''Opt-in cProfile sampling of requests.
+
+PROFILE_SAMPLE_RATE profiles that fraction of requests at random, and
+PROFILE_SLOW_MS keeps the profile of any request slower than that many
+milliseconds. Watching for slow requests means profiling every one,
+which costs roughly doubled CPU time, so turn that on only while hunting
+a regression. Both are off by default.
+
+Each kept profile is a pstats file named after its endpoint in
+PROFILE_DIR. snakeviz, flameprof or gprof2dot can read these, and
+``flask profile summarize`` merges them. Once the directory holds
+PROFILE_MAX_FILES profiles, the oldest are removed.
+'''
+import cProfile
+import os
+import random
+import tempfile
+import time
+from flask import current_app, g, request
+
+
+class RequestProfiler(object):
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_SLOW_MS', None)
+        app.config.setdefault('PROFILE_DIR', None)
+        app.config.setdefault('PROFILE_MAX_FILES', 200)
+        app.before_request(self.start)
+        app.teardown_request(self.finish)
+
+    def directory(self, app=None):
+        app = app or current_app
+        return app.config['PROFILE_DIR'] or os.path.join(
+            app.instance_path, 'profiles')
+
+    def start(self):
+        config = current_app.config
+        sampled = random.random() < config['PROFILE_SAMPLE_RATE']
+        if not sampled and config['PROFILE_SLOW_MS'] is None:
+            return
+        g.profile = (cProfile.Profile(), time.perf_counter(), sampled)
+        g.profile[0].enable()
+
+    def finish(self, exc=None):
+        if 'profile' not in g:
+            return
+        profile, started, sampled = g.pop('profile')
+        profile.disable()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        slow_ms = current_app.config['PROFILE_SLOW_MS']
+        if sampled or slow_ms is not None and elapsed_ms >= slow_ms:
+            self.save(profile, request.endpoint or 'none', elapsed_ms)
+
+    def save(self, profile, endpoint, elapsed_ms):
+        directory = self.directory()
+        os.makedirs(directory, exist_ok=True)
+        self.prune(directory, current_app.config['PROFILE_MAX_FILES'] - 1)
+        name = f'{endpoint}.{time.time():.6f}.{elapsed_ms:.0f}ms.prof'
+        # written aside and renamed so summaries never read half a file
+        fd, tmp = tempfile.mkstemp(prefix='.', dir=directory)
+        os.close(fd)
+        profile.dump_stats(tmp)
+        os.replace(tmp, os.path.join(directory, name))
+
+    def prune(self, directory, keep):
+        paths = profile_paths(directory)
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:max(0, len(paths) - keep)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def profile_paths(directory, endpoint=None):
+    '''the saved profiles in directory, optionally of one endpoint'''
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in os.listdir(directory)
+            if name.endswith('.prof') and not name.startswith('.') and
+            (endpoint is None or name.split('.', 1)[0] == endpoint)]
@@ -0,0 +1,134 @@
+'''Queries shared by the HTML pages and the JSON API.'''
+from datetime import datetime
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload
+from app import app, db
+from app.models import Artist, Genre, Venue, Show
+from app.search import match
+
+# the unique sort key each listing is ordered and paged by
+LISTING_KEYS = {
+    Artist: [Artist.id],
+    # (city, state, id) keeps each area contiguous and walks
+    # ix_Venue_listing
+    Venue: [Venue.city, Venue.state, Venue.id],
+    Show: [Show.start_time, Show.id],
+}
+
+
+def with_genre(query, model, genre):
+    '''restricts query to rows of model tagged with genre, joining from the
+    genre through its indexed association table'''
+    if not genre:
+        return query
+    return query.join(model.genres).filter(Genre.name == genre)
+
+
+def search_with_upcoming_shows(model, search, genre=None):
+    '''full-text matches for search, best first, each with its number of
+    upcoming shows read from the maintained counter'''
+    query = db.session.query(
+        model.id, model.name,
+        model.upcoming_shows_count.label('num_upcoming_shows'))
+    query = with_genre(query, model, genre)
+    limit = app.config['SEARCH_LIMIT']
+    matches = match(model, search, limit)
+    if matches is None:
+        query = query.order_by(model.name)
+    else:
+        query = query.join(matches, matches.c.id == model.id).order_by(
+            matches.c.rank, model.name)
+    return query.limit(limit).all()
+
+
+def in_range(query, start, end):
+    '''start <= Show.start_time < end, either bound being optional'''
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    return query
+
+
+def calendar_args(args):
+    '''the show filters of a query string: ?from= and ?to= (exclusive)
+    dates or times, ?artist_id=, ?venue_id= and ?city=. Raises ValueError
+    if one of them does not parse.'''
+    import dateutil.parser
+    try:
+        start, end = [dateutil.parser.parse(args[bound])
+                      if args.get(bound) else None
+                      for bound in ('from', 'to')]
+    except OverflowError as e:
+        raise ValueError(str(e))
+    return {
+        'start': start, 'end': end,
+        'artist_id': int(args['artist_id']) if args.get('artist_id')
+        else None,
+        'venue_id': int(args['venue_id']) if args.get('venue_id') else None,
+        'city': args.get('city') or None,
+    }
+
+
+def in_calendar(query, start=None, end=None, artist_id=None, venue_id=None,
+                city=None):
+    '''restricts a Show query to the filters read by calendar_args. The
+    range is one scan of ix_Show_start_time, or of the (artist_id,
+    start_time) or (venue_id, start_time) index when there is an artist
+    or venue; a city becomes its venue ids, read from ix_Venue_city_state'''
+    query = in_range(query, start, end)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if city is not None:
+        query = query.filter(Show.venue_id.in_(
+            db.session.query(Venue.id).filter(Venue.city == city)))
+    return query
+
+
+def split_shows(query, related):
+    '''runs query as two statements, one for upcoming and one for past
+    shows, eager-loading the related artist or venue of each show'''
+    now = datetime.now()
+    query = query.options(joinedload(related))
+    upcoming = query.filter(Show.start_time > now).order_by(
+        Show.start_time).all()
+    past = query.filter(Show.start_time <= now).order_by(
+        Show.start_time.desc()).all()
+    return upcoming, past
+
+
+# A deleted show leaves no later updated_at behind, so no timestamp can
+# say when these pages last changed. They are validated by ETag alone,
+# which counts the shows.
+def detail_validators(model, show_fk, related, related_fk):
+    '''validators for an artist or venue page: its own updated_at, the
+    shows and related records it lists, and how many of those shows have
+    started, since that moves them from upcoming to past'''
+    def validators(**view_args):
+        (id,) = view_args.values()
+        started = case([(Show.start_time <= datetime.now(), 1)])
+        row = db.session.query(
+            model.updated_at, func.max(Show.updated_at),
+            func.max(related.updated_at), func.count(Show.id),
+            func.count(started)).outerjoin(
+            Show, show_fk == model.id).outerjoin(
+            related, related.id == related_fk).filter(
+            model.id == id).group_by(model.id, model.updated_at).first()
+        if row is None:
+            return None
+        return None, row
+    return validators
+
+
+def shows_validators(**view_args):
+    '''validators for the show listings, which depend on every show, on
+    the names and images of every artist and venue, and on today's date,
+    which the quick range links start from'''
+    row = db.session.query(
+        db.session.query(func.max(Show.updated_at)).as_scalar(),
+        db.session.query(func.count(Show.id)).as_scalar(),
+        db.session.query(func.max(Artist.updated_at)).as_scalar(),
+        db.session.query(func.max(Venue.updated_at)).as_scalar()).one()
+    return None, tuple(row) + (datetime.now().date(),)
@@ -1,46 +1,95 @@
 #  ----------------------------------------------------------------
 # Imports
 #  ----------------------------------------------------------------
-import babel
 from flask import render_template, request, flash, redirect, \
-    url_for, abort, jsonify
-from app import app, db
-from datetime import datetime
-import dateutil.parser
-from app.forms import ArtistForm, ShowForm, VenueForm
-from app.models import Artist, Venue, Show
-import sys
+    url_for, abort, jsonify, Response, stream_with_context
+from app import app, cache, db, metrics
+from app import export as exports, ical
+from datetime import datetime, timedelta
+from functools import lru_cache
+from app.models import Artist, Genre, Venue, Show
+from app.conditional import conditional
+from app.pagination import keyset_paginate
+from app.queries import LISTING_KEYS, with_genre, \
+    search_with_upcoming_shows, split_shows, detail_validators, \
+    shows_validators, calendar_args, in_calendar
+from itertools import groupby
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import joinedload
+from werkzeug.datastructures import MultiDict
 
 
 # ----------------------------------------------------------------
 # Filters
 # ----------------------------------------------------------------
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    '''compiled Babel pattern and locale for a (format, locale) pair'''
+    from babel import Locale
+    from babel.dates import parse_pattern
+    return parse_pattern(DATETIME_FORMATS.get(format, format)), \
+        Locale.parse(locale)
+
+
+@lru_cache(maxsize=app.config['DATETIME_CACHE_SIZE'])
+def format_pattern(value, format, locale):
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
+
+
+def format_datetime(value, format='medium', locale=None):
+    '''formats a datetime, or a string holding one, with a named or
+    literal Babel pattern; results are kept in a bounded LRU'''
+    if not isinstance(value, datetime):
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    return format_pattern(
+        value, format, locale or app.config['DATETIME_LOCALE'])
 
 
 app.jinja_env.filters['datetime'] = format_datetime
 
+
 #  ----------------------------------------------------------------
 # Index Route
 # ----------------------------------------------------------------
 @app.route('/')
+@cache.cached()
 def index():
     return render_template('pages/home.html')
 
+@app.route('/cache/stats')
+def cache_stats():
+    '''page cache hit, miss and invalidation counters'''
+    return jsonify(cache.stats)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    '''per-endpoint request metrics in the Prometheus text format'''
+    return Response(metrics.render(),
+                    mimetype='text/plain; version=0.0.4')
+
 #  ----------------------------------------------------------------
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@cache.cached()
 def artists():
-    '''shows list of artists in database'''
-    artists = Artist.query.all()
-    return render_template('pages/artists.html', artists=artists)
+    '''shows list of artists in database, one page at a time, optionally
+    only those playing ?genre='''
+    genre = request.args.get('genre')
+    page = keyset_paginate(with_genre(Artist.query, Artist, genre),
+                           LISTING_KEYS[Artist])
+    prev_url, next_url = page.urls('artists')
+    return render_template('pages/artists.html', artists=page.items,
+                           genre=genre, prev_url=prev_url, next_url=next_url)
 
 
 #  ----------------------------------------------------------------
@@ -51,29 +100,20 @@ def search_artists():
     '''search artists table using partial matches to strings'''
     # Get users search input
     search = request.form.get('search_term', '')
-    artists = Artist.query.filter(Artist.name.ilike(f"%{search}%")).all()
+    genre = request.values.get('genre')
+    artists = search_with_upcoming_shows(Artist, search, genre)
     response = {
         "count": 0,
-        "data": []
-    }
-    #
-    for artist in artists:
-        # calculate upcoming shows for artist
-        num_upcoming_shows = 0
-        shows = Show.query.filter_by(artist_id=artist.id).all()
-        for show in shows:
-            if show.start_time > datetime.now():
-                num_upcoming_shows += 1
-        response['data'].append({
+        "data": [{
             "id": artist.id,
             "name": artist.name,
-            "num_upcoming_shows": num_upcoming_shows
-        })
+            "num_upcoming_shows": artist.num_upcoming_shows
+        } for artist in artists]
+    }
 
     response['count'] = len(response['data'])
     return render_template(
         'pages/search_artists.html', results=response, search_term=search)
-    print('------ {0}'.format(request.form))
 
 
 #  ----------------------------------------------------------------
@@ -82,6 +122,7 @@ def search_artists():
 @app.route('/artists/create', methods=['GET', 'POST'])
 def create_artist():
     '''create new artist'''
+    from app.forms import ArtistForm
     form = ArtistForm()
     if request.method == "POST":
         # import ipdb
@@ -89,7 +130,7 @@ def create_artist():
         if form.validate_on_submit():
             artist = Artist(
                 name=form.name.data,
-                genres=",".join(form.genres.data),
+                genres=Genre.from_names(form.genres.data),
                 city=form.city.data,
                 state=form.state.data,
                 phone=form.phone.data,
@@ -112,48 +153,33 @@ def create_artist():
 # Artist Show
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>')
+@conditional(detail_validators(Artist, Show.artist_id, Venue, Show.venue_id))
+@cache.cached()
 def show_artist(artist_id):
     '''shows artists page with all information'''
     # query artist by id
-    artist = Artist.query.filter_by(id=artist_id).first()
-    # query shows matching artist id
-    shows = Show.query.filter_by(artist_id=artist_id).all()
-
-    def upcoming_shows():
-        # TODO: refactor this to a higher scope function
-        upcoming = []
-
-        for show in shows:
-            if show.start_time > datetime.now():
-                upcoming.append({
-                    "venue_id": show.venue_id,
-                    "venue_name": Venue.query.filter_by(
-                        id=show.venue_id).first().name,
-                    "venue_image_link": Venue.query.filter_by(
-                        id=show.venue_id).first().image_link,
-                    "start_time": format_datetime(str(show.start_time))
-                })
-        return upcoming
-
-    def past_shows():
-        past = []
-
-        for show in shows:
-            if show.start_time < datetime.now():
-                past.append({
-                    "venue_id": show.venue_id,
-                    "venue_name": Venue.query.filter_by(
-                        id=show.venue_id).first().name,
-                    "venue_image_link": Venue.query.filter_by(
-                        id=show.venue_id).first().image_link,
-                    "start_time": format_datetime(str(show.start_time))
-                })
-        return past
+    artist = Artist.query.options(joinedload(Artist.genres)).filter_by(
+        id=artist_id).first_or_404()
+    # upcoming and past shows, each with its venue joined in
+    upcoming, past = split_shows(
+        Show.query.filter_by(artist_id=artist_id), Show.Venue)
+    upcoming_shows = [{
+        "venue_id": show.venue_id,
+        "venue_name": show.Venue.name,
+        "venue_image_link": show.Venue.image_link,
+        "start_time": show.start_time
+    } for show in upcoming]
+    past_shows = [{
+        "venue_id": show.venue_id,
+        "venue_name": show.Venue.name,
+        "venue_image_link": show.Venue.image_link,
+        "start_time": show.start_time
+    } for show in past]
 
     data = {
         'id': artist.id,
         'name': artist.name,
-        'genres': artist.genres,
+        'genres': [genre.name for genre in artist.genres],
         'city': artist.city,
         'state': artist.state,
         'phone': artist.phone,
@@ -161,10 +187,10 @@ def show_artist(artist_id):
         'facebook_link': artist.facebook_link,
         'seeking_description': artist.seeking_description,
         'image_link': artist.image_link,
-        'past_shows': past_shows(),
-        'upcoming_shows': upcoming_shows(),
-        'past_shows_count': len(past_shows()),
-        'upcoming_shows_count': len(upcoming_shows())
+        'past_shows': past_shows,
+        'upcoming_shows': upcoming_shows,
+        'past_shows_count': len(past_shows),
+        'upcoming_shows_count': len(upcoming_shows)
     }
 
     return render_template('pages/show_artist.html', artist=data)
@@ -175,13 +201,14 @@ def show_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['GET', 'POST'])
 def edit_artist(artist_id):
     '''pulls artist form and populates with current artist data'''
+    from app.forms import ArtistForm
     form = ArtistForm()
     # query artist
     artist = Artist.query.filter_by(id=artist_id).first_or_404()
     # populate form with artist data
     if form.validate_on_submit():
         artist.name = form.name.data
-        artist.genres = ",".join(form.genres.data)
+        artist.genres = Genre.from_names(form.genres.data)
         artist.city = form.city.data
         artist.state = form.state.data
         artist.phone = form.phone.data
@@ -196,7 +223,7 @@ def edit_artist(artist_id):
         return redirect(url_for('edit_artist', artist_id=artist_id))
     elif request.method == 'GET':
         form.name.data = artist.name
-        form.genres.data = artist.genres
+        form.genres.data = [genre.name for genre in artist.genres]
         form.city.data = artist.city
         form.state.data = artist.state
         form.phone.data = artist.phone
@@ -221,7 +248,7 @@ def delete_artist(artist_id):
     except:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not delete artist %s', artist_id)
     finally:
         db.session.close()
     if error:
@@ -235,32 +262,46 @@ def delete_artist(artist_id):
 #  Venues
 #  ----------------------------------------------------------------
 @app.route('/venues')
+@cache.cached()
 def venues():
-    '''Index of all venues'''
-    # query all venues
-    venue_groups = db.session.query(Venue.city, Venue.state).group_by(
-        Venue.city, Venue.state).all()
+    '''Index of all venues, grouped by area, optionally only those hosting
+    ?genre='''
+    genre = request.args.get('genre')
+    # each venue carries its own upcoming show count, so the page is one
+    # plain query in (city, state, id) order, keeping each area contiguous
+    listing = db.session.query(
+        Venue.id, Venue.name, Venue.city, Venue.state,
+        Venue.upcoming_shows_count.label('num_upcoming_shows'))
+    listing = with_genre(listing, Venue, genre)
+    page = keyset_paginate(listing, LISTING_KEYS[Venue])
+    areas = [(city, state, list(venues)) for (city, state), venues in groupby(
+        page.items, key=lambda venue: (venue.city, venue.state))]
+
+    # an area can straddle pages, so its total comes from a second
+    # aggregate over just the areas on this page, and the listed genre
+    area_counts = {}
+    if areas:
+        in_areas = or_(*[and_(Venue.city == city, Venue.state == state)
+                         for city, state, _ in areas])
+        counts = with_genre(db.session.query(
+            Venue.city, Venue.state,
+            func.sum(Venue.upcoming_shows_count)), Venue, genre).filter(
+            in_areas).group_by(Venue.city, Venue.state)
+        area_counts = {(city, state): count for city, state, count in counts}
+
     result = []
-    for venue_group in venue_groups:
-        city_name = venue_group[0]
-        city_state = venue_group[1]
-        filtered = db.session.query(Venue).filter(
-            Venue.city == city_name, Venue.state == city_state)
-        group = {
-            "city": city_name,
-            "state": city_state,
-            "venues": []
-        }
-        venues = filtered.all()
-
-        for venue in venues:
-            if venue.city == group['city'] and venue.state == group['state']:
-                group['venues'].append({
-                    "id": venue.id,
-                    "name": venue.name,
-                })
-        result.append(group)
-    return render_template('pages/venues.html', areas=result)
+    for city, state, venues in areas:
+        result.append({
+            "city": city,
+            "state": state,
+            "num_upcoming_shows": area_counts.get((city, state), 0),
+            "venues": [{"id": venue.id, "name": venue.name,
+                        "num_upcoming_shows": venue.num_upcoming_shows}
+                       for venue in venues]
+        })
+    prev_url, next_url = page.urls('venues')
+    return render_template('pages/venues.html', areas=result, genre=genre,
+                           prev_url=prev_url, next_url=next_url)
 
 #  ----------------------------------------------------------------
 # Venue Search
@@ -270,28 +311,18 @@ def search_venues():
     '''Search venues, using partial strings'''
     # Get users search input
     search = request.form.get('search_term', '')
-    venues = Venue.query.filter(Venue.name.ilike(f"%{search}%")).all()
-    # Appending details of searched artist to response
+    genre = request.values.get('genre')
+    venues = search_with_upcoming_shows(Venue, search, genre)
     response = {
         "count": 0,
-        "data": []
-    }
-    #
-    for venue in venues:
-        # calculate upcoming shows for artist
-        num_upcoming_shows = 0
-        shows = Show.query.filter_by(venue_id=venue.id).all()
-        for show in shows:
-            if show.start_time > datetime.now():
-                num_upcoming_shows += 1
-        response['data'].append({
+        "data": [{
             "id": venue.id,
             "name": venue.name,
-            "num_upcoming_shows": num_upcoming_shows
-        })
+            "num_upcoming_shows": venue.num_upcoming_shows
+        } for venue in venues]
+    }
 
     response['count'] = len(response['data'])
-    print('------ {0}'.format(request.form))
     return render_template(
         'pages/search_venues.html', results=response, search_term=search)
 
@@ -301,12 +332,13 @@ def search_venues():
 @app.route('/venues/create', methods=['GET', 'POST'])
 def create_venue():
     '''create new venue'''
+    from app.forms import VenueForm
     form = VenueForm()
     if request.method == 'POST':
         if form.validate_on_submit():
             venue = Venue(
                 name=form.name.data,
-                genres=",".join(form.genres.data),
+                genres=Genre.from_names(form.genres.data),
                 address=form.address.data,
                 city=form.city.data,
                 state=form.state.data,
@@ -330,48 +362,35 @@ def create_venue():
 # Venue Show
 #  ----------------------------------------------------------------
 @app.route('/venues/<int:venue_id>')
+@conditional(detail_validators(Venue, Show.venue_id, Artist, Show.artist_id))
+@cache.cached()
 def show_venue(venue_id):
     '''shows the venue page with the given venue_id'''
     # query first venue by id
-    # Get all venues
-    venue = Venue.query.filter_by(id=venue_id).first()
-
-    # Get all shows for a particular venue
-    shows = Show.query.filter_by(venue_id=venue.id).all()
-
-    # Return upcoming shows
-    def upcoming_shows():
-        # If show is in future, add details
-        upcoming = []
-        for show in shows:
-            if show.start_time > datetime.now():
-                upcoming.append({
-                    "artist_id": show.artist_id,
-                    "artist_name": Artist.query.filter_by(id=show.artist_id).first().name,
-                    "artist_image_link": Artist.query.filter_by(id=show.artist_id).first().image_link,
-                    "start_time": str(show.start_time)
-                })
-        return upcoming
-
-    # Return past shows
-    def past_shows():
-        past = []
-
-        for show in shows:
-            if show.start_time <= datetime.now():
-                past.append({
-                    "artist_id": show.artist_id,
-                    "artist_name": Artist.query.filter_by(id=show.artist_id).first().name,
-                    "artist_image_link": Artist.query.filter_by(id=show.artist_id).first().image_link,
-                    "start_time": str(show.start_time)
-                })
-        return past
+    venue = Venue.query.options(joinedload(Venue.genres)).filter_by(
+        id=venue_id).first_or_404()
+
+    # upcoming and past shows, each with its artist joined in
+    upcoming, past = split_shows(
+        Show.query.filter_by(venue_id=venue_id), Show.Artist)
+    upcoming_shows = [{
+        "artist_id": show.artist_id,
+        "artist_name": show.Artist.name,
+        "artist_image_link": show.Artist.image_link,
+        "start_time": show.start_time
+    } for show in upcoming]
+    past_shows = [{
+        "artist_id": show.artist_id,
+        "artist_name": show.Artist.name,
+        "artist_image_link": show.Artist.image_link,
+        "start_time": show.start_time
+    } for show in past]
 
     # Details for given venue
     details = {
         "id": venue.id,
         "name": venue.name,
-        "genres": venue.genres,
+        "genres": [genre.name for genre in venue.genres],
         "address": venue.address,
         "city": venue.city,
         "state": venue.state,
@@ -381,10 +400,10 @@ def show_venue(venue_id):
         "seeking_talent": venue.seeking_talent,
         "seeking_description": venue.seeking_description,
         "image_link": venue.image_link,
-        "past_shows": past_shows(),
-        "upcoming_shows": upcoming_shows(),
-        "past_shows_count": len(past_shows()),
-        "upcoming_shows_count": len(upcoming_shows())
+        "past_shows": past_shows,
+        "upcoming_shows": upcoming_shows,
+        "past_shows_count": len(past_shows),
+        "upcoming_shows_count": len(upcoming_shows)
     }
 
     return render_template('pages/show_venue.html', venue=details)
@@ -396,13 +415,14 @@ def show_venue(venue_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['GET', 'POST'])
 def edit_venue(venue_id):
     '''pulls venue form and populates with current artist data'''
+    from app.forms import VenueForm
     form = VenueForm()
     # query artist
     venue = Venue.query.filter_by(id=venue_id).first_or_404()
     # populate form with artist data
     if request.method == 'POST':
         venue.name = form.name.data
-        venue.genres = ",".join(form.genres.data)
+        venue.genres = Genre.from_names(form.genres.data)
         venue.address = form.address.data
         venue.city = form.city.data
         venue.state = form.state.data
@@ -418,7 +438,7 @@ def edit_venue(venue_id):
         return redirect(url_for('edit_venue', venue_id=venue_id))
     if request.method == 'GET':
         form.name.data = venue.name
-        form.genres.data = venue.genres
+        form.genres.data = [genre.name for genre in venue.genres]
         form.address.data = venue.address
         form.city.data = venue.city
         form.state.data = venue.state
@@ -440,13 +460,13 @@ def delete_venue(venue_id):
     error = False
     try:
         # query venue that matches id
-        venue = Venue.query.filter_by(Venue.id == venue_id).first()
+        venue = Venue.query.filter_by(id=venue_id).first()
         db.session.delete(venue)
         db.session.commit()
     except:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not delete venue %s', venue_id)
     finally:
         db.session.close()
     if error:
@@ -460,43 +480,229 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 #  Shows
 #  ----------------------------------------------------------------
-@app.route('/shows')
-def shows():
-    '''displays list of shows at /shows'''
-    shows = Show.query.all()
+def calendar_filters():
+    '''the show filters of the query string, answering 400 if one does
+    not parse'''
+    try:
+        return calendar_args(request.args)
+    except ValueError:
+        abort(400)
+
+
+def quick_ranges(today):
+    '''(label, from, to) of the ranges linked from the shows page'''
+    day = timedelta(days=1)
+    # Friday to Sunday, or what is left of it
+    weekend = today + timedelta(days=max(0, 4 - today.weekday()))
+    return [
+        ('Today', today, today + day),
+        ('This weekend', weekend, today + timedelta(
+            days=7 - today.weekday())),
+        ('Next 7 days', today, today + 7 * day),
+    ]
+
+
+def kept_filters():
+    '''the query string arguments a link to another range keeps'''
+    return {key: value for key, value in request.args.items()
+            if key not in ('from', 'to', 'after', 'before')}
+
+
+def shows_page(template, start=None, end=None, paged=True, **context):
+    '''renders one page of the shows matching the query string filters,
+    between start and end instead of ?from= and ?to= when they are given;
+    all of them, in one page, when not paged'''
+    filters = calendar_filters()
+    if start is not None:
+        filters.update(start=start, end=end)
+    # load artist and venue alongside each show in a single joined query
+    query = in_calendar(
+        Show.query.options(joinedload(Show.Artist), joinedload(Show.Venue)),
+        **filters)
+    if paged:
+        page = keyset_paginate(query, LISTING_KEYS[Show])
+        items = page.items
+        prev_url, next_url = page.urls(request.endpoint, **request.view_args)
+    else:
+        items = query.order_by(*LISTING_KEYS[Show]).all()
+        prev_url = next_url = None
     data = []
 
-    for show in shows:
+    for show in items:
         data.append({
             'venue_id': show.venue_id,
-            'venue_name': Venue.query.filter_by(id=show.venue_id).first().name,
-            'aritst_id': show.artist_id,
-            'artist_name': Artist.query.filter_by(
-                id=show.artist_id).first().name,
-            'aritst_image_link': Artist.query.filter_by(
-                id=show.artist_id).first().image_link,
-            'start_time': format_datetime(str(show.start_time))
+            'venue_name': show.Venue.name,
+            'artist_id': show.artist_id,
+            'artist_name': show.Artist.name,
+            'artist_image_link': show.Artist.image_link,
+            'start_time': show.start_time
         })
-    return render_template('pages/shows.html', shows=data)
+    ranges = [(label, url_for('shows', **kept_filters(), **{
+        'from': start.isoformat(), 'to': end.isoformat()}))
+        for label, start, end in quick_ranges(datetime.now().date())]
+    return render_template(template, shows=data, filters=filters,
+                           ranges=ranges, prev_url=prev_url,
+                           next_url=next_url, **context)
+
+
+@app.route('/shows')
+@conditional(shows_validators)
+@cache.cached()
+def shows():
+    '''displays list of shows at /shows, optionally only those between
+    ?from= and ?to=, of ?artist_id=, at ?venue_id= or in ?city='''
+    return shows_page('pages/shows.html')
+
+
+@app.route('/shows/calendar')
+def calendar():
+    '''the calendar of the current month'''
+    today = datetime.now().date()
+    return redirect(url_for('calendar_month', year=today.year,
+                            month=today.month, **kept_filters()))
+
+
+@app.route('/shows/calendar/<int:year>/<int:month>')
+@conditional(shows_validators)
+@cache.cached()
+def calendar_month(year, month):
+    '''the shows of one month, grouped by day, with the other filters of
+    /shows. The month is the page: a grid missing the shows past the
+    first PER_PAGE would look complete, so the whole month is read.'''
+    if not 1 <= month <= 12 or not 1 <= year < 9999:
+        abort(404)
+    start = datetime(year, month, 1)
+    end = datetime(year + month // 12, month % 12 + 1, 1)
+    previous = start - timedelta(days=1)
+    return shows_page(
+        'pages/calendar.html', start, end, paged=False, month=start,
+        prev_month=url_for('calendar_month', year=previous.year,
+                           month=previous.month, **kept_filters()),
+        next_month=url_for('calendar_month', year=end.year,
+                           month=end.month, **kept_filters()))
+
+
+def calendar_feed(name, filename, **filters):
+    '''streams the shows matching filters and the ?from= and ?to= of the
+    query string as an iCalendar file'''
+    bounds = calendar_filters()
+    query = ical.feed_query(start=bounds['start'], end=bounds['end'],
+                            **filters)
+    return Response(
+        stream_with_context(ical.to_ical(
+            name, query, request.host.split(':')[0], request.url_root)),
+        mimetype='text/calendar', headers={
+            'Content-Disposition': f'inline; filename={filename}.ics'})
+
+
+@app.route('/artists/<int:artist_id>/shows.ics')
+@conditional(detail_validators(Artist, Show.artist_id, Venue, Show.venue_id))
+def artist_calendar(artist_id):
+    '''the shows of an artist as an iCalendar feed'''
+    artist = Artist.query.get_or_404(artist_id)
+    return calendar_feed(artist.name, f'artist-{artist_id}',
+                         artist_id=artist_id)
+
+
+@app.route('/venues/<int:venue_id>/shows.ics')
+@conditional(detail_validators(Venue, Show.venue_id, Artist, Show.artist_id))
+def venue_calendar(venue_id):
+    '''the shows at a venue as an iCalendar feed'''
+    venue = Venue.query.get_or_404(venue_id)
+    return calendar_feed(venue.name, f'venue-{venue_id}', venue_id=venue_id)
 
 #  ----------------------------------------------------------------
 # Shows Create
 #  ----------------------------------------------------------------
+def book_shows(form):
+    '''books the show of a validated ShowForm, or every show of its rule,
+    in one transaction; returns their start times'''
+    # like the forms, loaded by the first booking, not at startup
+    from app import schedule
+    from app.schedule import ScheduleError
+    try:
+        artist_id = int(form.artist_id.data)
+        venue_id = int(form.venue_id.data)
+    except (TypeError, ValueError):
+        raise ScheduleError('artist_id and venue_id must be integers.')
+    if form.start_time.data is None:
+        raise ScheduleError('A show needs a start time.')
+    times = schedule.occurrences(form.start_time.data, form.repeat.data,
+                                 form.repeat_until.data,
+                                 form.interval.data or 1)
+    try:
+        schedule.book(artist_id, venue_id, times)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    # the bulk INSERT bypasses the session hooks of the page cache
+    cache.clear()
+    return times
+
+
 @app.route('/shows/create', methods=['GET', 'POST'])
 def create_show():
     '''submits show form to database'''
+    from app.forms import ShowForm
+    from app.schedule import ScheduleError
     form = ShowForm()
     if request.method == 'POST':
         if form.validate_on_submit():
-            show = Show(
-                artist_id=form.artist_id.data,
-                venue_id=form.venue_id.data,
-                start_time=form.start_time.data)
-            print('------ {0}'.format(request.form))
-            db.session.add(show)
-            db.session.commit()
-            flash('Show was successfully listed!')
-            return redirect(url_for('shows'))
+            try:
+                times = book_shows(form)
+            except ScheduleError as e:
+                flash(' '.join([str(e)] + [
+                    format_datetime(show.start_time, 'medium')
+                    for show in e.conflicts]))
+            else:
+                flash('Show was successfully listed!' if len(times) == 1
+                      else f'{len(times)} shows were successfully listed!')
+                return redirect(url_for('shows'))
         else:
             flash("Found errors: {}".format(form.errors))
     return render_template('forms/new_show.html', form=form)
+
+
+@app.route('/shows/batch', methods=['POST'])
+def create_shows():
+    '''books a show, or a recurring rule of shows, from a JSON body or
+    form fields named as on the create page; answers in JSON'''
+    from app.forms import ShowForm
+    from app.schedule import ScheduleError
+    values = request.get_json(silent=True)
+    if isinstance(values, dict):
+        formdata = MultiDict({key: str(value) for key, value in values.items()
+                              if value is not None})
+    else:
+        formdata = request.form
+    form = ShowForm(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return jsonify({'error': form.errors}), 400
+    try:
+        times = book_shows(form)
+    except ScheduleError as e:
+        return jsonify({'error': str(e), 'conflicts': [{
+            'id': show.id, 'artist_id': show.artist_id,
+            'start_time': show.start_time.isoformat()}
+            for show in e.conflicts]}), 409 if e.conflicts else 400
+    return jsonify({'created': len(times), 'start_times': [
+        time.isoformat() for time in times]}), 201
+
+
+#  ----------------------------------------------------------------
+#  Export
+#  ----------------------------------------------------------------
+@app.route('/export/<kind>.<format>')
+def export(kind, format):
+    '''streams every artist, venue or show as CSV or JSONL, optionally
+    limited to shows starting between ?from= and ?to='''
+    if kind not in exports.QUERIES or format not in exports.FORMATS:
+        abort(404)
+    filters = calendar_filters()
+    fieldnames, rows = exports.export_rows(
+        kind, filters['start'], filters['end'])
+    return Response(
+        stream_with_context(exports.FORMATS[format](fieldnames, rows)),
+        mimetype=exports.MIMETYPES[format], headers={
+            'Content-Disposition': f'attachment; filename={kind}.{format}'})
@@ -0,0 +1,112 @@
+'''Recurring shows: a residency is one rule, expanded into its shows and
+booked in one go.
+
+A rule repeats a show weekly or monthly, every ``interval`` weeks or
+months, up to and including the ``until`` date. Monthly shows keep the
+day of the month of the first one, or the last day of a shorter month.
+The shows of a rule are checked for double-booking with one query, then
+inserted with one multi-row INSERT in the caller's transaction, so a
+rule is booked whole or not at all. A venue holds one show at a time:
+shows starting less than SHOW_BOOKING_HOURS apart clash.
+'''
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from app import db
+from app import counters
+from app.models import Artist, Venue, Show
+
+FREQUENCIES = ('weekly', 'monthly')
+# shows one rule may book, which also bounds the size of its statements
+MAX_SHOWS = 200
+
+
+class ScheduleError(ValueError):
+    '''a rule that cannot be booked; conflicts holds the shows it clashes
+    with'''
+
+    def __init__(self, message, conflicts=()):
+        super().__init__(message)
+        self.conflicts = list(conflicts)
+
+
+def occurrences(start, frequency=None, until=None, interval=1):
+    '''the start times of a rule; just start when frequency is None'''
+    if not frequency:
+        return [start]
+    if frequency not in FREQUENCIES:
+        raise ScheduleError('Repeat must be one of ' +
+                            ', '.join(FREQUENCIES) + '.')
+    if until is None or until < start.date():
+        raise ScheduleError('A repeating show needs an end date on or after '
+                            'its first show.')
+    if interval < 1:
+        raise ScheduleError('The interval must be at least 1.')
+    step = relativedelta(weeks=interval) if frequency == 'weekly' else \
+        relativedelta(months=interval)
+    times = []
+    while True:
+        # always from start, so a month's clamped day does not stick
+        time = start + step * len(times)
+        if time.date() > until:
+            return times
+        if len(times) == MAX_SHOWS:
+            raise ScheduleError(f'A rule can book at most {MAX_SHOWS} shows.')
+        times.append(time)
+
+
+def double_bookings(venue_id, times, window):
+    '''(id, artist_id, start_time) of the shows at venue_id starting less
+    than window from any of times, found with one query over the
+    (venue_id, start_time) index'''
+    return db.session.query(
+        Show.id, Show.artist_id, Show.start_time
+    ).filter(Show.venue_id == venue_id, or_(*[
+        and_(Show.start_time > time - window, Show.start_time < time + window)
+        for time in times])).order_by(Show.start_time).all()
+
+
+def lock_venue(venue_id):
+    '''locks the row of venue_id until the transaction ends, returning
+    whether it exists. SQLAlchemy drops FOR UPDATE on SQLite, where
+    pysqlite only begins the transaction at its first write, so there a
+    no-op UPDATE takes the database's write lock instead; the columns are
+    set to themselves so updated_at keeps its value.'''
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return db.session.query(Venue.id).filter_by(
+            id=venue_id).with_for_update().first() is not None
+    venues = Venue.__table__
+    return connection.execute(venues.update().where(
+        venues.c.id == venue_id).values(
+        id=venues.c.id, updated_at=venues.c.updated_at)).rowcount > 0
+
+
+def book(artist_id, venue_id, times):
+    '''adds a show of artist_id at venue_id at each of times and returns
+    how many; the caller commits, or rolls back on a ScheduleError'''
+    if db.session.query(Artist.id).filter_by(id=artist_id).first() is None:
+        raise ScheduleError(f'No artist {artist_id}.')
+    # locking the venue makes concurrent bookings of the venue wait here,
+    # so each sees the shows the one before it inserted
+    if not lock_venue(venue_id):
+        raise ScheduleError(f'No venue {venue_id}.')
+    window = timedelta(hours=current_app.config['SHOW_BOOKING_HOURS'])
+    conflicts = double_bookings(venue_id, times, window)
+    if conflicts:
+        raise ScheduleError(
+            f'The venue is already booked for {len(conflicts)} of these '
+            f'shows.', conflicts)
+
+    now = datetime.utcnow()
+    connection = db.session.connection()
+    connection.execute(Show.__table__.insert().values([
+        {'artist_id': artist_id, 'venue_id': venue_id, 'start_time': time,
+         'updated_at': now} for time in times]))
+    # the INSERT skips the session hooks that keep the counters and route
+    # this visitor's next reads to the primary
+    counters.recount(connection, Artist, [artist_id])
+    counters.recount(connection, Venue, [venue_id])
+    db.session.info['wrote'] = True
+    return len(times)
@@ -0,0 +1,190 @@
+'''Full-text search over artist and venue names, genres and locations.
+
+SQLite databases keep an FTS5 table per model (artist_search,
+venue_search) whose rowid is the model id. Postgres keeps a weighted
+``search_vector`` tsvector column on each model table with a GIN index,
+plus a trigram index on name for fuzzy matches. Either way the index is
+updated from the session whenever an Artist or Venue is flushed, inside
+the same transaction. Any other backend falls back to ILIKE on name.
+'''
+import re
+from sqlalchemy import event, literal, text, Float, Integer
+from app import db
+from app.models import Artist, Venue
+
+SEARCH_TABLES = {Artist: 'artist_search', Venue: 'venue_search'}
+INDEXED_FIELDS = ('name', 'genres', 'city', 'state')
+# bm25 column weights, in INDEXED_FIELDS order
+WEIGHTS = '10.0, 4.0, 2.0, 1.0'
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokens(term):
+    return TOKEN.findall(term or '')
+
+
+def backend(bind):
+    return bind.dialect.name
+
+
+def match(model, term, limit):
+    '''returns a selectable of (id, rank) for the best limit rows of model
+    matching term, where a lower rank is a better match, or None when term
+    has nothing to match on'''
+    words = tokens(term)
+    if not words:
+        return None
+    name = backend(db.session.get_bind())
+    if name == 'sqlite':
+        table = SEARCH_TABLES[model]
+        # every word is a quoted prefix query, so punctuation typed by the
+        # user can never be read as FTS5 syntax
+        query = ' '.join('"{}"*'.format(word) for word in words)
+        statement = text(
+            f'SELECT rowid AS id, bm25({table}, {WEIGHTS}) AS rank '
+            f'FROM {table} WHERE {table} MATCH :query '
+            f'ORDER BY rank LIMIT :limit').bindparams(
+            query=query, limit=limit)
+    elif name == 'postgresql':
+        table = model.__tablename__
+        query = ' & '.join(word + ':*' for word in words)
+        statement = text(
+            f'SELECT id, -(ts_rank(search_vector, q) '
+            f'+ similarity(name, :term)) AS rank '
+            f'FROM "{table}", ' "to_tsquery('simple', :query) q "
+            f'WHERE search_vector @@ q OR name % :term '
+            f'ORDER BY rank LIMIT :limit').bindparams(
+            query=query, term=term, limit=limit)
+    else:
+        return db.session.query(
+            model.id.label('id'), literal(0.0).label('rank')).filter(
+            model.name.ilike(f"%{term}%")).limit(limit).subquery()
+    return statement.columns(id=Integer, rank=Float).alias()
+
+
+#  ----------------------------------------------------------------
+#  Index maintenance
+#  ----------------------------------------------------------------
+def document(obj):
+    values = {field: getattr(obj, field) or '' for field in INDEXED_FIELDS
+              if field != 'genres'}
+    values['genres'] = ' '.join(genre.name for genre in obj.genres)
+    values['id'] = obj.id
+    return values
+
+
+def genre_names(connection, model):
+    '''correlated subquery of the space-separated genre names of a row'''
+    link = model.genres.property.secondary
+    (fk,) = [column for column in link.c if column.name != 'genre_id']
+    aggregate = 'group_concat' if backend(connection) == 'sqlite' \
+        else 'string_agg'
+    return (f"(SELECT {aggregate}(g.name, ' ') FROM {link.name} link "
+            f'JOIN "Genre" g ON g.id = link.genre_id '
+            f'WHERE link.{fk.name} = "{model.__tablename__}".id)')
+
+
+def search_vector(name, genres, place):
+    '''weighted tsvector over name (A), genres (B) and city/state (C)'''
+    return (f"setweight(to_tsvector('simple', coalesce({name}, '')), 'A') || "
+            f"setweight(to_tsvector('simple', coalesce({genres}, '')), 'B') "
+            f"|| setweight(to_tsvector('simple', {place}), 'C')")
+
+
+def index_documents(connection, model, objs):
+    write_documents(connection, model, [document(obj) for obj in objs])
+
+
+def write_documents(connection, model, documents):
+    '''indexes documents, dicts of id and INDEXED_FIELDS, replacing any
+    existing entries for the same ids'''
+    name = backend(connection)
+    if not documents or name not in ('sqlite', 'postgresql'):
+        return
+    if name == 'postgresql':
+        vector = search_vector(':name', ':genres', ":city || ' ' || :state")
+        connection.execute(text(
+            f'UPDATE "{model.__tablename__}" SET search_vector = {vector} '
+            'WHERE id = :id'), documents)
+        return
+    table = SEARCH_TABLES[model]
+    connection.execute(
+        text(f'DELETE FROM {table} WHERE rowid = :id'),
+        [{'id': values['id']} for values in documents])
+    connection.execute(
+        text(f'INSERT INTO {table} (rowid, {", ".join(INDEXED_FIELDS)}) '
+             f'VALUES (:id, :{", :".join(INDEXED_FIELDS)})'),
+        documents)
+
+
+def unindex_documents(connection, model, ids):
+    ids = list(ids)
+    if ids and backend(connection) == 'sqlite':
+        connection.execute(
+            text(f'DELETE FROM {SEARCH_TABLES[model]} WHERE rowid = :id'),
+            [{'id': id} for id in ids])
+
+
+def reindex(connection):
+    '''rebuilds the search index from the model tables'''
+    name = backend(connection)
+    place = "coalesce(city, '') || ' ' || coalesce(state, '')"
+    for model, table in SEARCH_TABLES.items():
+        genres = genre_names(connection, model)
+        if name == 'postgresql':
+            vector = search_vector('name', genres, place)
+            connection.execute(text(
+                f'UPDATE "{model.__tablename__}" SET search_vector = {vector}'))
+        elif name == 'sqlite':
+            connection.execute(text(f'DELETE FROM {table}'))
+            connection.execute(text(
+                f'INSERT INTO {table} (rowid, {", ".join(INDEXED_FIELDS)}) '
+                "SELECT id, coalesce(name, ''), "
+                f"coalesce({genres}, ''), "
+                "coalesce(city, ''), coalesce(state, '') "
+                f'FROM "{model.__tablename__}"'))
+
+
+@event.listens_for(db.session, 'after_flush')
+def sync_search_index(session, flush_context):
+    '''keeps the search index in step with the flushed models'''
+    connection = session.connection()
+    if backend(connection) not in ('sqlite', 'postgresql'):
+        return
+    for model in SEARCH_TABLES:
+        changed = [obj for obj in session.new | session.dirty
+                   if isinstance(obj, model)]
+        deleted = [obj.id for obj in session.deleted
+                   if isinstance(obj, model)]
+        index_documents(connection, model, changed)
+        unindex_documents(connection, model, deleted)
+
+
+@event.listens_for(db.Model.metadata, 'after_create')
+def create_search_tables(target, connection, **kw):
+    name = backend(connection)
+    if name == 'sqlite':
+        for table in SEARCH_TABLES.values():
+            connection.execute(text(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5('
+                f'{", ".join(INDEXED_FIELDS)}, tokenize="unicode61")'))
+    elif name == 'postgresql':
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        for model in SEARCH_TABLES:
+            table = model.__tablename__
+            connection.execute(text(
+                f'ALTER TABLE "{table}" ADD COLUMN search_vector tsvector'))
+            connection.execute(text(
+                f'CREATE INDEX ix_{table}_search_vector ON "{table}" '
+                f'USING gin (search_vector)'))
+            connection.execute(text(
+                f'CREATE INDEX ix_{table}_name_trgm ON "{table}" '
+                f'USING gin (name gin_trgm_ops)'))
+
+
+@event.listens_for(db.Model.metadata, 'before_drop')
+def drop_search_tables(target, connection, **kw):
+    if backend(connection) != 'sqlite':
+        return
+    for table in SEARCH_TABLES.values():
+        connection.execute(text(f'DROP TABLE IF EXISTS {table}'))
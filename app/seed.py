@@ -0,0 +1,139 @@
+'''Deterministic synthetic catalogue for development and benchmarks.
+
+The same seed and sizes always produce the same rows, with show dates
+laid out around the day the data is generated. Popularity is
+skewed the way real listings are: a few artists and venues play most of
+the shows, and a few cities hold most of the venues. Rows are generated
+and inserted a chunk at a time with executemany, so memory stays flat
+even for millions of shows.
+'''
+import itertools
+import random
+from datetime import datetime, timedelta
+from app import counters, db, search
+from app.importer import reset_sequence
+from app.models import Artist, Genre, Venue, Show, artist_genres, \
+    venue_genres
+
+WORDS = ['wild', 'sax', 'band', 'guns', 'petals', 'flaming', 'lips',
+         'electric', 'moon', 'river', 'city', 'velvet', 'echo', 'neon',
+         'collective', 'trio', 'orchestra', 'brothers', 'sisters', 'ghost',
+         'honey', 'thunder', 'static', 'paper', 'silver', 'midnight']
+VENUE_WORDS = ['hall', 'room', 'lounge', 'club', 'theatre', 'tavern',
+               'garden', 'warehouse', 'cellar', 'ballroom']
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic',
+          'Folk', 'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+          'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+          'Soul', 'Other']
+# most venues are in the first few cities
+CITIES = [('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'),
+          ('Austin', 'TX'), ('San Francisco', 'CA'), ('Seattle', 'WA'),
+          ('Nashville', 'TN'), ('Denver', 'CO'), ('Atlanta', 'GA'),
+          ('Portland', 'OR'), ('Boston', 'MA'), ('New Orleans', 'LA')]
+
+
+def zipf_weights(count, exponent):
+    '''cumulative weights where item n is about n ** exponent times less
+    likely than the first'''
+    return list(itertools.accumulate(
+        1 / (n ** exponent) for n in range(1, count + 1)))
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def name(rng, words, suffix):
+    return ' '.join(rng.sample(words, 2)).title() + f' {suffix}'
+
+
+def artist_rows(rng, count):
+    for id in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        yield {'id': id, 'name': name(rng, WORDS, id), 'city': city,
+               'state': state, 'phone': f'555-{rng.randint(0, 9999):04d}',
+               'facebook_link': f'https://www.facebook.com/artist{id}',
+               'image_link': f'https://picsum.photos/seed/a{id}/300',
+               'seeking_venue': rng.random() < 0.3}
+
+
+def venue_rows(rng, count):
+    city_weights = zipf_weights(len(CITIES), 1.1)
+    for id in range(1, count + 1):
+        (city, state), = rng.choices(CITIES, cum_weights=city_weights)
+        street = rng.choice(WORDS).title()
+        yield {'id': id, 'name': name(rng, WORDS + VENUE_WORDS, id),
+               'address': f'{rng.randint(1, 9999)} {street} Street',
+               'city': city, 'state': state,
+               'phone': f'555-{rng.randint(0, 9999):04d}',
+               'facebook_link': f'https://www.facebook.com/venue{id}',
+               'image_link': f'https://picsum.photos/seed/v{id}/300',
+               'seeking_talent': rng.random() < 0.5}
+
+
+def genre_links(rng, fk, count):
+    genre_weights = zipf_weights(len(GENRES), 0.8)
+    for id in range(1, count + 1):
+        genres = set(rng.choices(range(1, len(GENRES) + 1),
+                                 cum_weights=genre_weights,
+                                 k=rng.randint(1, 3)))
+        for genre_id in sorted(genres):
+            yield {fk: id, 'genre_id': genre_id}
+
+
+def show_rows(rng, count, artists, venues, now):
+    '''shows spread over the year either side of now, in the evening'''
+    # steep enough for headliners, shallow enough that no one artist or
+    # venue dominates a large catalogue
+    artist_weights = zipf_weights(artists, 0.6)
+    venue_weights = zipf_weights(venues, 0.6)
+    start = now.replace(hour=0, minute=0, second=0, microsecond=0) - \
+        timedelta(days=365)
+    for id in range(1, count + 1):
+        yield {'id': id,
+               'artist_id': rng.choices(
+                   range(1, artists + 1), cum_weights=artist_weights)[0],
+               'venue_id': rng.choices(
+                   range(1, venues + 1), cum_weights=venue_weights)[0],
+               'start_time': start + timedelta(
+                   days=rng.randrange(730), hours=rng.randint(18, 23),
+                   minutes=rng.choice((0, 15, 30, 45)))}
+
+
+def seed(artists, venues, shows, seed=0, chunk_size=10000, now=None,
+         progress=None):
+    '''fills an empty database; progress(table, rows) is called after
+    every chunk'''
+    rng = random.Random(seed)
+    now = now or datetime.now()
+    tables = [
+        (Genre.__table__, ({'id': id, 'name': genre}
+                           for id, genre in enumerate(GENRES, 1))),
+        (Artist.__table__, artist_rows(rng, artists)),
+        (artist_genres, genre_links(rng, 'artist_id', artists)),
+        (Venue.__table__, venue_rows(rng, venues)),
+        (venue_genres, genre_links(rng, 'venue_id', venues)),
+    ]
+    if artists and venues:
+        tables.append(
+            (Show.__table__, show_rows(rng, shows, artists, venues, now)))
+    for table, rows in tables:
+        inserted = 0
+        for chunk in chunks(rows, chunk_size):
+            with db.engine.begin() as connection:
+                connection.execute(table.insert(), chunk)
+            inserted += len(chunk)
+            if progress is not None:
+                progress(table.name, inserted)
+    with db.engine.begin() as connection:
+        search.reindex(connection)
+        for model in counters.PARENTS:
+            counters.recount(connection, model, now=now)
+    for model in (Genre, Artist, Venue, Show):
+        reset_sequence(model)
+    db.session.commit()
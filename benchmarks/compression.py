@@ -0,0 +1,155 @@
+'''Weighs the CPU cost of gzip against the bytes it saves, per response
+and per compression level, to choose COMPRESS_LEVEL.
+
+    python benchmarks/compression.py --output compression.json
+    python benchmarks/compression.py --levels 1,4,6,9 --runs 50
+
+The responses of the larger pages, API lists, exports and feeds are
+fetched once, uncompressed, from a throwaway SQLite database seeded with
+--artists/--venues/--shows. Each is then compressed --runs times at every
+level, the way app/compress.py does it: in one go for buffered pages, a
+flushed chunk at a time for streamed ones. The CPU time per response is
+the median of the runs, measured with process_time. A summary gives the
+total over all responses at each level: bytes saved, CPU milliseconds,
+and bytes saved per CPU millisecond.
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+    tempfile.mkdtemp(), 'compression.db')
+
+from app import app, cache, db  # noqa: E402
+from app.compress import gzip_body, gzip_stream  # noqa: E402
+from app.seed import seed  # noqa: E402
+
+
+def responses():
+    '''(name, method, path, data) of each measured response'''
+    today = datetime.now().date()
+    month = f'from={today}&to={today + timedelta(days=31)}'
+    return [
+        ('artists', 'GET', '/artists', None),
+        ('venues', 'GET', '/venues', None),
+        ('artist_detail', 'GET', '/artists/1', None),
+        ('shows', 'GET', '/shows', None),
+        ('shows_month', 'GET', f'/shows/calendar/{today.year}/'
+                               f'{today.month}', None),
+        ('artist_search', 'POST', '/artists/search', {'search_term': 'a'}),
+        ('api_shows', 'GET', '/api/v1/shows?embed=artist,venue&per_page=100',
+         None),
+        ('venue_ics', 'GET', '/venues/1/shows.ics', None),
+        ('export_shows_csv', 'GET', f'/export/shows.csv?{month}', None),
+        ('export_artists_jsonl', 'GET', '/export/artists.jsonl', None),
+    ]
+
+
+def fetch(client, method, path, data):
+    '''the body of a response, uncompressed, as it was sent: one chunk
+    when buffered, the list of chunks when streamed'''
+    response = client.open(path, method=method, data=data)
+    if response.status_code != 200:
+        raise SystemExit(f'{path} answered {response.status_code}')
+    if response.is_streamed:
+        return [chunk for chunk in response.response]
+    return response.get_data()
+
+
+def measure(body, level, runs):
+    '''(compressed bytes, median CPU ms) of compressing body at level'''
+    times = []
+    for i in range(runs):
+        started = time.process_time()
+        if isinstance(body, list):
+            size = sum(len(chunk) for chunk in gzip_stream(iter(body), level))
+        else:
+            size = len(gzip_body(body, level))
+        times.append((time.process_time() - started) * 1000)
+    return size, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--artists', type=int, default=2000)
+    parser.add_argument('--venues', type=int, default=400)
+    parser.add_argument('--shows', type=int, default=40000)
+    parser.add_argument('--levels', default='1,2,3,4,5,6,7,8,9')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='compressions per response and level')
+    parser.add_argument('--output', default='compression.json')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(',')]
+
+    app.config.update(WTF_CSRF_ENABLED=False, COMPRESS_ENABLED=False,
+                      CACHE_TYPE='null')
+    cache.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed(args.artists, args.venues, args.shows)
+        db.session.remove()
+
+    client = app.test_client()
+    results = {}
+    totals = {level: {'original_bytes': 0, 'compressed_bytes': 0,
+                      'cpu_ms': 0.0} for level in levels}
+    for name, method, path, data in responses():
+        body = fetch(client, method, path, data)
+        original = sum(len(chunk) for chunk in body) \
+            if isinstance(body, list) else len(body)
+        result = results[name] = {
+            'path': path, 'streamed': isinstance(body, list),
+            'original_bytes': original, 'levels': {}}
+        for level in levels:
+            size, cpu_ms = measure(body, level, args.runs)
+            result['levels'][level] = {
+                'compressed_bytes': size,
+                'ratio': round(size / original, 4) if original else None,
+                'cpu_ms': round(cpu_ms, 3),
+            }
+            total = totals[level]
+            total['original_bytes'] += original
+            total['compressed_bytes'] += size
+            total['cpu_ms'] += cpu_ms
+        print(f'{name:<22}{original:>10} B  ' + '  '.join(
+            f'{level}: {result["levels"][level]["ratio"]:.3f} '
+            f'{result["levels"][level]["cpu_ms"]:6.2f} ms'
+            for level in levels))
+
+    print(f'\n{"level":<7}{"saved":>12}{"ratio":>8}{"cpu ms":>10}'
+          f'{"saved/ms":>12}')
+    for level, total in totals.items():
+        saved = total['original_bytes'] - total['compressed_bytes']
+        total['saved_bytes'] = saved
+        total['cpu_ms'] = round(total['cpu_ms'], 3)
+        total['saved_per_cpu_ms'] = round(saved / total['cpu_ms']) \
+            if total['cpu_ms'] else None
+        print(f'{level:<7}{saved:>12}'
+              f'{total["compressed_bytes"] / total["original_bytes"]:>8.3f}'
+              f'{total["cpu_ms"]:>10.2f}{total["saved_per_cpu_ms"] or 0:>12}')
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'artists': args.artists, 'venues': args.venues,
+            'shows': args.shows, 'runs': args.runs,
+        },
+        'responses': results,
+        'levels': totals,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nwrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+'''Shows the query plans and timings of the hot Show/Venue queries before
+and after the composite indexes are created.
+
+    python benchmarks/indexes.py --shows 1000000
+    DATABASE_URL=postgresql://localhost/fyyur_bench python benchmarks/indexes.py
+
+Without DATABASE_URL a throwaway SQLite file is used. The database is
+dropped and reseeded, so never point this at real data.
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import bindparam, text  # noqa: E402
+from app import app, db  # noqa: E402
+from app.models import Artist, Venue, Show  # noqa: E402
+
+INDEXES = [index for model in (Show, Venue)
+           for index in model.__table__.indexes
+           if index.name in ('ix_Show_artist_id_start_time',
+                             'ix_Show_venue_id_start_time',
+                             'ix_Venue_city_state')]
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'),
+          ('Chicago', 'IL'), ('Seattle', 'WA'), ('Denver', 'CO')]
+QUERIES = {
+    'artist upcoming shows': '''
+        SELECT "Show".id, "Show".start_time, "Venue".name
+        FROM "Show" JOIN "Venue" ON "Venue".id = "Show".venue_id
+        WHERE "Show".artist_id = :artist_id AND "Show".start_time > :now
+        ORDER BY "Show".start_time''',
+    'venue past shows': '''
+        SELECT "Show".id, "Show".start_time, "Artist".name
+        FROM "Show" JOIN "Artist" ON "Artist".id = "Show".artist_id
+        WHERE "Show".venue_id = :venue_id AND "Show".start_time <= :now
+        ORDER BY "Show".start_time DESC''',
+    'search upcoming counts': '''
+        SELECT "Artist".id, count("Show".id)
+        FROM "Artist" LEFT OUTER JOIN "Show"
+        ON "Show".artist_id = "Artist".id AND "Show".start_time > :now
+        WHERE "Artist".id BETWEEN :artist_id AND :artist_id + 49
+        GROUP BY "Artist".id''',
+    'area upcoming count': '''
+        SELECT "Venue".city, "Venue".state, count("Show".id)
+        FROM "Venue" JOIN "Show" ON "Show".venue_id = "Venue".id
+        WHERE "Show".start_time > :now
+        AND "Venue".city = :city AND "Venue".state = :state
+        GROUP BY "Venue".city, "Venue".state''',
+}
+
+
+def seed(artists, venues, shows, chunk=50000):
+    rng = random.Random(7)
+    db.engine.execute(Artist.__table__.insert(), [
+        {'name': f'Artist {i}'} for i in range(artists)])
+    db.engine.execute(Venue.__table__.insert(), [
+        dict(zip(('city', 'state'), rng.choice(CITIES)), name=f'Venue {i}')
+        for i in range(venues)])
+    start = datetime.now() - timedelta(days=365)
+    for offset in range(0, shows, chunk):
+        db.engine.execute(Show.__table__.insert(), [{
+            'artist_id': rng.randint(1, artists),
+            'venue_id': rng.randint(1, venues),
+            'start_time': start + timedelta(minutes=rng.randint(0, 1051200))
+        } for _ in range(min(chunk, shows - offset))])
+
+
+def explain(sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' \
+        else 'EXPLAIN '
+    rows = db.engine.execute(statement(prefix + sql), params).fetchall()
+    return [str(row[-1]) for row in rows]
+
+
+def statement(sql):
+    return text(sql).bindparams(bindparam('now', type_=db.DateTime))
+
+
+def report(label, params, repeat):
+    print(f'\n=== {label} ===')
+    for name, sql in QUERIES.items():
+        seconds = min(timeit.repeat(
+            lambda: db.engine.execute(statement(sql), params).fetchall(),
+            number=1, repeat=repeat))
+        print(f'{name:<24}{seconds * 1000:>10.2f} ms')
+        for line in explain(sql, params):
+            print(f'    {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=20000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for index in INDEXES:
+            index.drop(db.engine)
+        seed(args.artists, args.venues, args.shows)
+        params = {'artist_id': args.artists // 2, 'venue_id': args.venues // 2,
+                  'now': datetime.now(), 'city': 'Austin', 'state': 'TX'}
+        print(f'{args.artists} artists, {args.venues} venues, '
+              f'{args.shows} shows; best of {args.repeat} runs')
+        report('before', params, args.repeat)
+        for index in INDEXES:
+            index.create(db.engine)
+        if db.engine.dialect.name == 'sqlite':
+            db.engine.execute('ANALYZE')
+        report('after', params, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+'''Drives every route through the Flask test client and records latency
+percentiles, SQL query counts and peak memory per route as JSON.
+
+    python benchmarks/routes.py --output bench.json
+    python benchmarks/routes.py --output new.json --baseline bench.json
+    DATABASE_URL=postgresql://localhost/fyyur_bench python benchmarks/routes.py
+
+Without DATABASE_URL a throwaway SQLite database is seeded with
+--artists/--venues/--shows. With DATABASE_URL the database is used as it
+is, so seed it first with ``flask seed``. The write routes create,
+edit and delete rows of their own, so never point this at real data.
+The page cache is off unless --cache is given, so every request does
+its full work. With --baseline the run is compared route by route with
+an earlier output file.
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+SEED_DATABASE = not os.environ.get('DATABASE_URL')
+if SEED_DATABASE:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import event, func  # noqa: E402
+from app import app, cache, db  # noqa: E402
+from app.models import Artist, Venue  # noqa: E402
+from app.seed import GENRES, WORDS, seed  # noqa: E402
+
+ARTIST_FORM = {'name': 'Benchmark Band', 'city': 'Austin', 'state': 'TX',
+               'genres': ['Jazz', 'Blues'], 'phone': '555-0100',
+               'facebook_link': 'https://www.facebook.com/bench'}
+VENUE_FORM = dict(ARTIST_FORM, name='Benchmark Hall', address='1 Main St')
+
+
+class Scenario(object):
+    '''one route; request(i, rng) returns (method, path, data) for the
+    i-th request'''
+
+    def __init__(self, name, request):
+        self.name = name
+        self.request = request
+
+
+def get(name, path):
+    return Scenario(name, lambda i, rng: ('GET', path(rng), None))
+
+
+def scenarios(artists, venues):
+    '''every route, reads first; the write routes act only on the rows
+    their own create requests made, which get the ids after the seed'''
+    def artist(rng):
+        return rng.randint(1, artists)
+
+    def venue(rng):
+        return rng.randint(1, venues)
+
+    def slot(i, year):
+        '''(venue id, start time) of the i-th booking: the venues in turn,
+        then the next free time at each, so no booking clashes with
+        another and the write is measured, not the 409'''
+        start = datetime(year, 1, 1) + timedelta(
+            hours=app.config['SHOW_BOOKING_HOURS'] * (i // venues))
+        return i % venues + 1, str(start)
+
+    def term(rng):
+        return {'search_term': rng.choice(WORDS)}
+
+    window = datetime.now().date()
+    export_range = f'from={window}&to={window + timedelta(days=7)}'
+    return [
+        get('index', lambda rng: '/'),
+        get('cache_stats', lambda rng: '/cache/stats'),
+        get('metrics', lambda rng: '/metrics'),
+        get('static_file', lambda rng: '/static/css/main.css'),
+        get('artists', lambda rng: '/artists'),
+        get('artists_by_genre',
+            lambda rng: f'/artists?genre={rng.choice(GENRES)}'),
+        get('artist_detail', lambda rng: f'/artists/{artist(rng)}'),
+        get('artist_edit_form', lambda rng: f'/artists/{artist(rng)}/edit'),
+        get('artist_create_form', lambda rng: '/artists/create'),
+        Scenario('artist_search', lambda i, rng: (
+            'POST', '/artists/search', term(rng))),
+        get('venues', lambda rng: '/venues'),
+        get('venues_by_genre',
+            lambda rng: f'/venues?genre={rng.choice(GENRES)}'),
+        get('venue_detail', lambda rng: f'/venues/{venue(rng)}'),
+        get('venue_edit_form', lambda rng: f'/venues/{venue(rng)}/edit'),
+        get('venue_create_form', lambda rng: '/venues/create'),
+        Scenario('venue_search', lambda i, rng: (
+            'POST', '/venues/search', term(rng))),
+        get('shows', lambda rng: '/shows'),
+        get('shows_week', lambda rng: f'/shows?{export_range}'),
+        get('calendar_redirect', lambda rng: '/shows/calendar'),
+        get('shows_month', lambda rng: f'/shows/calendar/{window.year}/'
+                                       f'{window.month}'),
+        get('show_create_form', lambda rng: '/shows/create'),
+        get('artist_ics', lambda rng: f'/artists/{artist(rng)}/shows.ics'),
+        get('venue_ics', lambda rng: f'/venues/{venue(rng)}/shows.ics'),
+        get('export_shows_week', lambda rng: f'/export/shows.csv?'
+                                              f'{export_range}'),
+        get('api_artists', lambda rng: '/api/v1/artists?embed='
+                                       'upcoming_shows'),
+        get('api_shows', lambda rng: '/api/v1/shows?embed=artist,venue'),
+        get('api_venue_detail', lambda rng: f'/api/v1/venues/{venue(rng)}'),
+        Scenario('artist_create', lambda i, rng: (
+            'POST', '/artists/create', ARTIST_FORM)),
+        Scenario('artist_edit', lambda i, rng: (
+            'POST', f'/artists/{artists + 1 + i}/edit',
+            dict(ARTIST_FORM, name=f'Benchmark Band {i}'))),
+        Scenario('artist_delete', lambda i, rng: (
+            'DELETE', f'/artists/{artists + 1 + i}', None)),
+        Scenario('venue_create', lambda i, rng: (
+            'POST', '/venues/create', VENUE_FORM)),
+        Scenario('venue_edit', lambda i, rng: (
+            'POST', f'/venues/{venues + 1 + i}/edit',
+            dict(VENUE_FORM, name=f'Benchmark Hall {i}'))),
+        Scenario('venue_delete', lambda i, rng: (
+            'DELETE', f'/venues/{venues + 1 + i}', None)),
+        Scenario('show_create', lambda i, rng: (
+            'POST', '/shows/create', dict(zip(
+                ('venue_id', 'start_time'), slot(i, 2035)),
+                artist_id=artist(rng)))),
+        # a year of weekly shows per rule
+        Scenario('show_batch_weekly', lambda i, rng: (
+            'POST', '/shows/batch', dict(zip(
+                ('venue_id', 'start_time'), slot(i, 2036)),
+                artist_id=artist(rng), repeat='weekly',
+                repeat_until='2036-12-31'))),
+    ]
+
+
+def percentile(values, p):
+    '''nearest-rank percentile of sorted values'''
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def run(client, scenario, requests, rng, statements):
+    latencies, queries, errors = [], [], 0
+    for i in range(requests):
+        method, path, data = scenario.request(i, rng)
+        del statements[:]
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=data)
+        response.get_data()
+        latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(statements))
+        errors += response.status_code >= 400
+    latencies.sort()
+    return {
+        'example': f'{method} {path}',
+        'requests': requests,
+        'errors': errors,
+        'latency_ms': {
+            'p50': percentile(latencies, 50),
+            'p90': percentile(latencies, 90),
+            'p99': percentile(latencies, 99),
+            'max': latencies[-1],
+            'mean': sum(latencies) / len(latencies)},
+        'queries': {'mean': sum(queries) / len(queries),
+                    'max': max(queries)},
+    }
+
+
+def peak_memory(client, scenario, requests, rng):
+    '''peak Python heap, in KiB, over requests requests; measured
+    separately because tracing slows every allocation'''
+    tracemalloc.start()
+    try:
+        for i in range(requests):
+            method, path, data = scenario.request(i, rng)
+            client.open(path, method=method, data=data).get_data()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+
+def commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    print(f'\n{"route":<22}{"p50 ms":>10}{"was":>10}{"change":>9}'
+          f'{"queries":>9}{"was":>6}')
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        p50, was = result['latency_ms']['p50'], old['latency_ms']['p50']
+        change = (p50 - was) / was * 100 if was else 0.0
+        flag = '  <-- slower' if change > 10 else ''
+        print(f'{name:<22}{p50:>10.2f}{was:>10.2f}{change:>+8.0f}%'
+              f'{result["queries"]["max"]:>9}{old["queries"]["max"]:>6}'
+              f'{flag}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--artists', type=int, default=10000)
+    parser.add_argument('--venues', type=int, default=2000)
+    parser.add_argument('--shows', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=50,
+                        help='timed requests per route')
+    parser.add_argument('--memory-requests', type=int, default=3)
+    parser.add_argument('--only', help='comma separated route names')
+    parser.add_argument('--cache', action='store_true',
+                        help='keep the page cache on')
+    parser.add_argument('--output', default='benchmark.json')
+    parser.add_argument('--baseline', help='earlier output to compare with')
+    args = parser.parse_args()
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    if not args.cache:
+        app.config['CACHE_TYPE'] = 'null'
+        cache.init_app(app)
+    statements = []
+    with app.app_context():
+        if SEED_DATABASE:
+            db.create_all()
+            seed(args.artists, args.venues, args.shows)
+        artists = db.session.query(func.max(Artist.id)).scalar() or 0
+        venues = db.session.query(func.max(Venue.id)).scalar() or 0
+        db.session.remove()
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *a:
+                     statements.append(statement))
+        dialect = db.engine.dialect.name
+    selected = args.only.split(',') if args.only else None
+
+    client = app.test_client()
+    results = {}
+    for scenario in scenarios(artists, venues):
+        if selected and scenario.name not in selected:
+            continue
+        rng = random.Random(scenario.name)
+        result = run(client, scenario, args.requests, rng, statements)
+        # writes go to fresh rows, so their memory pass starts afterwards
+        offset = args.requests
+        result['peak_memory_kb'] = peak_memory(
+            client, Scenario(scenario.name, lambda i, rng, s=scenario:
+                             s.request(i + offset, rng)),
+            args.memory_requests, rng)
+        results[scenario.name] = result
+        latency = result['latency_ms']
+        print(f'{scenario.name:<22}p50 {latency["p50"]:8.2f} ms  '
+              f'p99 {latency["p99"]:8.2f} ms  '
+              f'{result["queries"]["max"]:3} queries  '
+              f'{result["peak_memory_kb"]:7} KiB'
+              + (f'  {result["errors"]} errors' if result['errors'] else ''))
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'commit': commit(),
+            'python': platform.python_version(),
+            'database': dialect,
+            'artists': artists, 'venues': venues,
+            'shows': args.shows if SEED_DATABASE else None,
+            'requests': args.requests,
+            'cache': args.cache,
+        },
+        'routes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nwrote {args.output}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f)['routes'])
+
+
+if __name__ == '__main__':
+    main()
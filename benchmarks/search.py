@@ -0,0 +1,78 @@
+'''Compares the full-text search index with the old leading-wildcard ILIKE
+scan on a throwaway SQLite database.
+
+    python benchmarks/search.py --artists 200000
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+workdir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+from app import app, db  # noqa: E402
+from app.models import Artist, Genre, artist_genres  # noqa: E402
+from app.search import match, reindex  # noqa: E402
+
+WORDS = ['wild', 'sax', 'band', 'guns', 'petals', 'matt', 'quevedo',
+         'flaming', 'lips', 'electric', 'moon', 'river', 'city', 'jazz',
+         'collective', 'trio', 'orchestra', 'brothers', 'sisters', 'echo']
+GENRES = ['Jazz', 'Rock n Roll', 'Blues', 'Folk', 'Classical', 'Punk']
+CITIES = [('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX')]
+TERMS = ['sax', 'moon river', 'jazz', 'zzz']
+
+
+def seed(count):
+    rng = random.Random(1)
+    rows, links = [], []
+    db.engine.execute(Genre.__table__.insert(),
+                      [{'id': i, 'name': name} for i, name in
+                       enumerate(GENRES, 1)])
+    for i in range(1, count + 1):
+        city, state = rng.choice(CITIES)
+        rows.append({
+            'id': i, 'name': ' '.join(rng.sample(WORDS, 3)).title() + f' {i}',
+            'city': city, 'state': state})
+        links.extend({'artist_id': i, 'genre_id': genre_id}
+                     for genre_id in rng.sample(range(1, len(GENRES) + 1), 2))
+    db.engine.execute(Artist.__table__.insert(), rows)
+    db.engine.execute(artist_genres.insert(), links)
+    with db.engine.begin() as connection:
+        reindex(connection)
+
+
+def ilike(term):
+    return Artist.query.filter(
+        Artist.name.ilike(f'%{term}%')).limit(50).all()
+
+
+def fts(term):
+    matches = match(Artist, term, 50)
+    return db.session.query(Artist).join(
+        matches, matches.c.id == Artist.id).order_by(matches.c.rank).all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    with app.app_context():
+        db.create_all()
+        seed(args.artists)
+        print(f'{args.artists} artists, best of {args.repeat} runs (ms)')
+        print(f'{"term":<12}{"ilike":>10}{"fts":>10}')
+        for term in TERMS:
+            results = []
+            for fn in (ilike, fts):
+                results.append(min(timeit.repeat(
+                    lambda: fn(term), number=1, repeat=args.repeat)) * 1000)
+            print(f'{term:<12}{results[0]:>10.2f}{results[1]:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+'''Measures cold start: the time from importing fyyur.py to the first
+response of a fresh process, with and without compiled templates.
+
+    python benchmarks/startup.py --output startup.json
+    python benchmarks/startup.py --path / --path /venues --runs 20
+
+Each run is a new interpreter that imports the app and requests each
+--path once through the test client. It reports the import time, the
+time of each first response, and the wall time of the whole process,
+interpreter start included. Three template modes are compared:
+
+    off     no bytecode cache; every process compiles its templates
+    cold    an empty cache directory, as right after a deploy
+    warm    a cache directory filled by ``flask precompile``
+
+Runs use a throwaway SQLite database with empty tables, so the timings
+are of imports and templates rather than of queries.
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('off', 'cold', 'warm')
+
+
+def child(paths):
+    '''runs inside the measured process; imports nothing of the app
+    before the clock starts'''
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import fyyur
+    result = {'import_ms': (time.perf_counter() - started) * 1000}
+    client = fyyur.app.test_client()
+    for path in paths:
+        request_started = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        if response.status_code != 200:
+            raise SystemExit(f'{path} answered {response.status_code}')
+        result[path] = (time.perf_counter() - request_started) * 1000
+    result['total_ms'] = (time.perf_counter() - started) * 1000
+    print(json.dumps(result))
+
+
+def spawn(args, env, cwd):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + args, env=env,
+        cwd=cwd, check=True, stdout=subprocess.PIPE).stdout
+    result = json.loads(output.decode().splitlines()[-1])
+    result['wall_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def environment(workdir, mode):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + os.path.join(
+        workdir, 'startup.db'), FLASK_APP=os.path.join(ROOT, 'fyyur.py'))
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    if mode == 'off':
+        env['TEMPLATE_BYTECODE_CACHE'] = '0'
+    else:
+        env['TEMPLATE_CACHE_DIR'] = os.path.join(workdir,
+                                                 f'templates-{mode}')
+    return env
+
+
+def run_mode(mode, paths, runs, workdir):
+    env = environment(workdir, mode)
+    if mode == 'warm':
+        subprocess.run([sys.executable, '-m', 'flask', 'precompile'],
+                       env=env, cwd=workdir, check=True,
+                       stdout=subprocess.DEVNULL)
+    results = []
+    for i in range(runs):
+        if mode == 'cold':
+            cache_dir = env['TEMPLATE_CACHE_DIR']
+            for name in os.listdir(cache_dir) \
+                    if os.path.isdir(cache_dir) else ():
+                os.remove(os.path.join(cache_dir, name))
+        results.append(spawn(['--child'] + [
+            arg for path in paths for arg in ('--path', path)], env, workdir))
+    return {key: statistics.median(result[key] for result in results)
+            for key in results[0]}
+
+
+def create_tables(workdir):
+    env = environment(workdir, 'off')
+    subprocess.run([sys.executable, '-c', 'from app import db; '
+                    'db.create_all()'], env=env, cwd=workdir, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--child', action='store_true',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--path', action='append', dest='paths',
+                        help='path to request; repeat for several')
+    parser.add_argument('--runs', type=int, default=10,
+                        help='processes started per mode')
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--output', default='startup.json')
+    args = parser.parse_args()
+    paths = args.paths or ['/', '/venues', '/artists/create']
+    if args.child:
+        return child(paths)
+
+    # the runs start in a scratch directory but import the repository
+    os.environ['PYTHONPATH'] = ROOT + os.pathsep + os.environ.get(
+        'PYTHONPATH', '')
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        create_tables(workdir)
+        for mode in args.modes.split(','):
+            result = results[mode] = run_mode(mode, paths, args.runs,
+                                              workdir)
+            print(f'{mode:<5} import {result["import_ms"]:7.1f} ms  ' +
+                  '  '.join(f'{path} {result[path]:6.1f} ms'
+                            for path in paths) +
+                  f'  total {result["total_ms"]:7.1f} ms'
+                  f'  wall {result["wall_ms"]:7.1f} ms')
+
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'runs': args.runs,
+            'paths': paths,
+        },
+        'modes': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nwrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -8,3 +8,51 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # GET requests read from the replica when one is configured
+    SQLALCHEMY_BINDS = {'replica': os.environ['DATABASE_REPLICA_URL']} \
+        if os.environ.get('DATABASE_REPLICA_URL') else None
+    DATABASE_REPLICA_PIN_SECONDS = int(
+        os.environ.get('DATABASE_REPLICA_PIN_SECONDS') or 5)
+    # pool of a server database; SQLite keeps its own
+    DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 5)
+    DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW') or 10)
+    DATABASE_POOL_TIMEOUT = int(os.environ.get('DATABASE_POOL_TIMEOUT') or 30)
+    DATABASE_POOL_RECYCLE = int(
+        os.environ.get('DATABASE_POOL_RECYCLE') or 1800)
+    DATABASE_POOL_PRE_PING = os.environ.get(
+        'DATABASE_POOL_PRE_PING', '1') != '0'
+    DATABASE_STATEMENT_TIMEOUT_MS = int(
+        os.environ['DATABASE_STATEMENT_TIMEOUT_MS']) \
+        if os.environ.get('DATABASE_STATEMENT_TIMEOUT_MS') else None
+    # shows at one venue starting closer together than this clash
+    SHOW_BOOKING_HOURS = int(os.environ.get('SHOW_BOOKING_HOURS') or 3)
+    PER_PAGE = 20
+    MAX_PER_PAGE = 100
+    SEARCH_LIMIT = int(os.environ.get('SEARCH_LIMIT') or 50)
+    DATETIME_LOCALE = os.environ.get('DATETIME_LOCALE') or 'en_US'
+    DATETIME_CACHE_SIZE = 4096
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or 'memory'
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+    CACHE_DEFAULT_TIMEOUT = 60
+    CACHE_THRESHOLD = 500
+    # JSON lines, written by a background thread; '-' for stderr
+    LOG_FILE = os.environ.get('LOG_FILE') or os.path.join(
+        basedir, 'logs', 'fyyur.log')
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES') or 10 * 1024 * 1024)
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT') or 10)
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS') or 500)
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE') or 0)
+    PROFILE_SLOW_MS = int(os.environ['PROFILE_SLOW_MS']) \
+        if os.environ.get('PROFILE_SLOW_MS') else None
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    PROFILE_MAX_FILES = 200
+    # compiled templates; without a directory, a private one under /tmp
+    TEMPLATE_BYTECODE_CACHE = os.environ.get(
+        'TEMPLATE_BYTECODE_CACHE', '1') != '0'
+    TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')
+    # gzip of text responses; turn off behind a proxy that compresses
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') != '0'
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 500)
+    COMPRESS_STREAMS = os.environ.get('COMPRESS_STREAMS', '1') != '0'
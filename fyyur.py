@@ -1,7 +1,8 @@
 from app import app, db
-from app.models import Artist, Venue, Show
+from app.models import Artist, Genre, Venue, Show
 
 
 @app.shell_context_processor
 def make_shell_context():
-    return {'db': db, 'Artist': Artist, 'Venue': Venue, 'Show': Show}
+    return {'db': db, 'Artist': Artist, 'Venue': Venue, 'Show': Show,
+            'Genre': Genre}
@@ -72,6 +72,15 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the full-text search objects are managed by hand (see app/search.py),
+    # so keep autogenerate from offering to drop them
+    def include_object(object, name, type_, reflected, compare_to):
+        if reflected and compare_to is None and name and (
+                name.startswith(('artist_search', 'venue_search')) or
+                name.endswith(('search_vector', '_name_trgm'))):
+            return False
+        return True
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section),
         prefix='sqlalchemy.',
@@ -83,6 +92,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=target_metadata,
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
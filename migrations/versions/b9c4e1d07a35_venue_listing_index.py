@@ -0,0 +1,26 @@
+"""index on the venue listing's sort key, with NULLs as ''
+
+Revision ID: b9c4e1d07a35
+Revises: 6107d41ed92b
+Create Date: 2026-10-18 18:30:12.731904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9c4e1d07a35'
+down_revision = '6107d41ed92b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_Venue_listing', 'Venue', [
+        sa.text("coalesce(city, '')"), sa.text("coalesce(state, '')"), 'id'],
+        unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_Venue_listing', table_name='Venue')
@@ -0,0 +1,61 @@
+"""full-text search index for artists and venues
+
+Revision ID: c41d8e2f7a90
+Revises: 5b435e16242d
+Create Date: 2026-10-18 09:12:31.204118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d8e2f7a90'
+down_revision = '5b435e16242d'
+branch_labels = None
+depends_on = None
+
+SEARCH_TABLES = {'Artist': 'artist_search', 'Venue': 'venue_search'}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table, search_table in SEARCH_TABLES.items():
+            op.execute(
+                f'CREATE VIRTUAL TABLE {search_table} USING fts5('
+                'name, genres, city, state, tokenize="unicode61")')
+            op.execute(
+                f'INSERT INTO {search_table} (rowid, name, genres, city, state) '
+                "SELECT id, coalesce(name, ''), "
+                "replace(coalesce(genres, ''), ',', ' '), "
+                "coalesce(city, ''), coalesce(state, '') "
+                f'FROM "{table}"')
+    elif dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table in SEARCH_TABLES:
+            op.execute(
+                f'ALTER TABLE "{table}" ADD COLUMN search_vector tsvector '
+                "GENERATED ALWAYS AS ("
+                "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector('simple', "
+                "replace(coalesce(genres, ''), ',', ' ')), 'B') || "
+                "setweight(to_tsvector('simple', "
+                "coalesce(city, '') || ' ' || coalesce(state, '')), 'C')) "
+                "STORED")
+            op.create_index(f'ix_{table}_search_vector', table,
+                            ['search_vector'], postgresql_using='gin')
+            op.execute(f'CREATE INDEX ix_{table}_name_trgm ON "{table}" '
+                       'USING gin (name gin_trgm_ops)')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for search_table in SEARCH_TABLES.values():
+            op.execute(f'DROP TABLE {search_table}')
+    elif dialect == 'postgresql':
+        for table in SEARCH_TABLES:
+            op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+            op.drop_index(f'ix_{table}_search_vector', table_name=table)
+            op.drop_column(table, 'search_vector')
@@ -0,0 +1,1260 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from flask import Flask, template_rendered
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.exc import OperationalError
+from app import app, assets, cache, counters, db
+from app.assets import build, clean, minify_css
+from app.cache import FileSystemCache
+from app.log import RequestLogging
+from app.models import Artist, Genre, Venue, Show
+from app.pagination import encode_cursor, keyset_paginate
+from app.routes import format_datetime, format_pattern
+from app.schedule import ScheduleError, occurrences
+from app.seed import seed
+
+
+@contextmanager
+def count_queries():
+    '''collects every SQL statement sent to the engine inside the block'''
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute',
+                     before_cursor_execute)
+
+
+@contextmanager
+def rendered_contexts():
+    '''collects the context of every template rendered inside the block'''
+    contexts = []
+
+    def record(sender, template, context, **extra):
+        contexts.append(context)
+
+    template_rendered.connect(record, app)
+    try:
+        yield contexts
+    finally:
+        template_rendered.disconnect(record, app)
+
+
+class FyyurTestCase(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        app.config['WTF_CSRF_ENABLED'] = False
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        db.create_all()
+        cache.clear()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+    def add_shows(self, count, artist=None, venue=None, start=None):
+        artist = artist or Artist(name='The Wild Sax Band', city='San Francisco',
+                                  state='CA', image_link='http://img/artist')
+        venue = venue or Venue(name='The Musical Hop', city='San Francisco',
+                               state='CA', image_link='http://img/venue')
+        start = start or datetime(2019, 5, 21, 21, 30)
+        db.session.add_all([artist, venue])
+        db.session.flush()
+        db.session.add_all([
+            Show(artist_id=artist.id, venue_id=venue.id,
+                 start_time=start + timedelta(days=i))
+            for i in range(count)
+        ])
+        db.session.commit()
+        return artist, venue
+
+
+class DatetimeFilterCase(unittest.TestCase):
+    def test_formats_datetimes_and_strings_alike(self):
+        value = datetime(2019, 5, 21, 21, 30)
+        self.assertEqual(format_datetime(value, 'full'),
+                         'Tuesday May, 21, 2019 at 9:30PM')
+        self.assertEqual(format_datetime(str(value), 'full'),
+                         format_datetime(value, 'full'))
+        self.assertEqual(format_datetime(value, 'MMMM', locale='fr_FR'), 'mai')
+
+    def test_formatted_values_are_cached(self):
+        value = datetime(2020, 1, 1, 20, 0)
+        format_datetime(value)
+        hits = format_pattern.cache_info().hits
+        format_datetime(value)
+        self.assertEqual(format_pattern.cache_info().hits, hits + 1)
+        self.assertEqual(format_pattern.cache_info().maxsize,
+                         app.config['DATETIME_CACHE_SIZE'])
+
+
+class ShowsPageCase(FyyurTestCase):
+    def test_shows_page_lists_artist_and_venue(self):
+        self.add_shows(1)
+        response = self.client.get('/shows')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'The Wild Sax Band', response.data)
+        self.assertIn(b'The Musical Hop', response.data)
+        self.assertIn(b'http://img/artist', response.data)
+
+    def test_shows_page_query_count_is_constant(self):
+        for _ in range(20):
+            self.add_shows(10)
+        db.session.remove()
+        with count_queries() as statements:
+            response = self.client.get('/shows')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(statements), 2)
+
+
+class DetailPageCase(FyyurTestCase):
+    def test_artist_page_query_count_is_constant(self):
+        artist, venue = self.add_shows(250)
+        self.add_shows(250, artist=artist, venue=Venue(name='Park Square'),
+                       start=datetime.now() + timedelta(days=1))
+        db.session.remove()
+        with count_queries() as statements:
+            response = self.client.get('/artists/1')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(statements), 4)
+        self.assertIn(b'250 Upcoming Shows', response.data)
+        self.assertIn(b'250 Past Shows', response.data)
+
+    def test_venue_page_splits_past_and_upcoming(self):
+        artist, venue = self.add_shows(2)
+        self.add_shows(3, artist=artist, venue=venue,
+                       start=datetime.now() + timedelta(days=1))
+        db.session.remove()
+        with count_queries() as statements:
+            response = self.client.get('/venues/1')
+        self.assertLessEqual(len(statements), 4)
+        self.assertIn(b'3 Upcoming Shows', response.data)
+        self.assertIn(b'2 Past Shows', response.data)
+        self.assertIn(b'The Wild Sax Band', response.data)
+
+    def test_missing_artist_is_404(self):
+        self.assertEqual(self.client.get('/artists/42').status_code, 404)
+
+
+class VenuesPageCase(FyyurTestCase):
+    def test_venues_are_grouped_with_upcoming_counts(self):
+        future = datetime.now() + timedelta(days=1)
+        self.add_shows(3, start=future)
+        self.add_shows(2, venue=Venue(name='Park Square', city='San Francisco',
+                                      state='CA'), start=future)
+        self.add_shows(1, venue=Venue(name='Dueling Pianos', city='New York',
+                                      state='NY'))
+        db.session.remove()
+        with count_queries() as statements:
+            response = self.client.get('/venues')
+        self.assertEqual(len(statements), 2)
+        self.assertIn(b'San Francisco, CA <small>5 upcoming shows', response.data)
+        self.assertIn(b'New York, NY <small>0 upcoming shows', response.data)
+        self.assertEqual(response.data.count(b'San Francisco, CA'), 1)
+
+
+class SearchCase(FyyurTestCase):
+    def test_search_counts_upcoming_shows_in_one_query(self):
+        self.add_shows(4, start=datetime.now() - timedelta(days=2))
+        db.session.remove()
+        with count_queries() as statements:
+            response = self.client.post('/artists/search',
+                                        data={'search_term': 'sax'})
+        self.assertEqual(len(statements), 1)
+        self.assertIn(b'"sax": 1', response.data)
+        with count_queries() as statements:
+            response = self.client.post('/venues/search',
+                                        data={'search_term': 'HOP'})
+        self.assertEqual(len(statements), 1)
+        self.assertIn(b'"HOP": 1', response.data)
+
+    def test_search_reports_upcoming_shows_from_the_counters(self):
+        artist, venue = self.add_shows(
+            2, start=datetime.now() - timedelta(days=3))
+        self.add_shows(3, artist=artist, venue=venue,
+                       start=datetime.now() + timedelta(days=1))
+        self.add_shows(1, artist=Artist(name='Guns N Petals'), venue=venue,
+                       start=datetime.now() + timedelta(days=2))
+        for path, term, expected in (
+                ('/artists/search', 'sax', [('The Wild Sax Band', 3)]),
+                ('/venues/search', 'hop', [('The Musical Hop', 4)])):
+            with rendered_contexts() as contexts:
+                self.client.post(path, data={'search_term': term})
+            (context,) = contexts
+            self.assertEqual(
+                [(item['name'], item['num_upcoming_shows'])
+                 for item in context['results']['data']], expected)
+
+    def test_search_results_are_limited(self):
+        db.session.add_all([Artist(name='artist %d' % i) for i in range(10)])
+        db.session.commit()
+        app.config['SEARCH_LIMIT'] = 3
+        self.addCleanup(app.config.__setitem__, 'SEARCH_LIMIT', 50)
+        response = self.client.post('/artists/search',
+                                    data={'search_term': 'a'})
+        self.assertIn(b'"a": 3', response.data)
+
+
+    def test_search_index_follows_create_edit_and_delete(self):
+        artist = Artist(name='Guns N Petals', city='Austin', state='TX',
+                        genres=Genre.from_names(['Rock n Roll', 'Jazz']))
+        db.session.add(artist)
+        db.session.commit()
+
+        def found(term):
+            response = self.client.post('/artists/search',
+                                        data={'search_term': term})
+            return b'/artists/1"' in response.data
+
+        self.assertTrue(found('petal'))
+        self.assertTrue(found('jazz austin'))
+        self.assertFalse(found('blues'))
+        artist = Artist.query.get(1)
+        artist.name = 'Matt Quevedo'
+        db.session.commit()
+        self.assertFalse(found('petals'))
+        self.assertTrue(found('quevedo'))
+        db.session.delete(Artist.query.get(1))
+        db.session.commit()
+        self.assertFalse(found('austin'))
+
+
+class PageCacheCase(FyyurTestCase):
+    def test_pages_are_cached_until_a_write(self):
+        self.add_shows(1)
+        self.assertEqual(self.client.get('/shows').headers['X-Cache'], 'MISS')
+        with count_queries() as statements:
+            response = self.client.get('/shows')
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+        # only the conditional GET validators run on a hit
+        self.assertEqual(len(statements), 1)
+        self.add_shows(1)
+        response = self.client.get('/shows')
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(response.data.count(b'The Wild Sax Band'), 2)
+
+    def test_flashed_messages_bypass_the_cache(self):
+        self.client.get('/artists')
+        with self.client.session_transaction() as session:
+            session['_flashes'] = [('message', 'Artist was listed!')]
+        response = self.client.get('/artists')
+        self.assertNotIn('X-Cache', response.headers)
+        self.assertIn(b'Artist was listed!', response.data)
+
+    def test_stats_are_exposed(self):
+        self.client.get('/')
+        self.client.get('/')
+        stats = self.client.get('/cache/stats').get_json()
+        self.assertGreaterEqual(stats['hits'], 1)
+        self.assertGreaterEqual(stats['misses'], 1)
+
+    def test_filesystem_backend(self):
+        backend = FileSystemCache(tempfile.mkdtemp(), threshold=2)
+        backend.set('a', b'1', 60)
+        backend.set('b', b'2', 60)
+        backend.set('c', b'3', 60)
+        self.assertEqual(backend.get('c'), b'3')
+        self.assertEqual(len(backend._files()), 2)
+        backend.set('d', b'4', -1)
+        self.assertIsNone(backend.get('d'))
+        backend.clear()
+        self.assertIsNone(backend.get('c'))
+
+
+class ConditionalGetCase(FyyurTestCase):
+    def test_unchanged_artist_page_is_not_modified(self):
+        self.add_shows(3)
+        response = self.client.get('/artists/1')
+        etag = response.headers['ETag']
+        # a deleted show would not move it, so there is none
+        self.assertNotIn('Last-Modified', response.headers)
+        db.session.remove()
+        with count_queries() as statements:
+            response = self.client.get(
+                '/artists/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(response.data, b'')
+
+    def test_related_write_changes_the_etag(self):
+        artist, venue = self.add_shows(1)
+        etag = self.client.get('/artists/1').headers['ETag']
+        venue = Venue.query.get(1)
+        venue.name = 'The Dueling Pianos Bar'
+        db.session.commit()
+        response = self.client.get('/artists/1',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'The Dueling Pianos Bar', response.data)
+
+    def test_rescheduled_show_changes_the_etag(self):
+        self.add_shows(1, start=datetime.now() + timedelta(seconds=1))
+        etag = self.client.get('/venues/1').headers['ETag']
+        show = Show.query.get(1)
+        show.start_time = datetime.now() - timedelta(seconds=1)
+        db.session.commit()
+        response = self.client.get('/venues/1',
+                                   headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_show_changes_the_etag(self):
+        self.add_shows(2)
+        for path in ('/shows', '/artists/1'):
+            self.assertNotIn('Last-Modified',
+                             self.client.get(path).headers)
+        etags = {path: self.client.get(path).headers['ETag']
+                 for path in ('/shows', '/artists/1', '/venues/1')}
+        db.session.delete(Show.query.get(2))
+        db.session.commit()
+        for path, etag in etags.items():
+            response = self.client.get(path, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200, path)
+
+    def test_show_listings_change_at_midnight(self):
+        self.add_shows(1)
+        tomorrow = datetime.now() + timedelta(days=1)
+
+        class Tomorrow(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return tomorrow
+
+        for path in ('/shows', '/shows/calendar/2019/5'):
+            etag = self.client.get(path).headers['ETag']
+            self.assertEqual(self.client.get(
+                path, headers={'If-None-Match': etag}).status_code, 304)
+            with mock.patch('app.queries.datetime', Tomorrow):
+                response = self.client.get(
+                    path, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200, path)
+
+    def test_missing_record_is_still_404(self):
+        self.assertEqual(self.client.get('/venues/9').status_code, 404)
+
+
+class GenreCase(FyyurTestCase):
+    def add_artist(self, name, genres):
+        artist = Artist(name=name, city='San Francisco', state='CA',
+                        genres=Genre.from_names(genres))
+        db.session.add(artist)
+        db.session.commit()
+        return artist
+
+    def test_genres_are_shared_rows(self):
+        self.add_artist('Guns N Petals', ['Rock n Roll', 'Jazz'])
+        self.add_artist('The Wild Sax Band', ['Jazz', 'Jazz'])
+        self.assertEqual(sorted(g.name for g in Genre.query),
+                         ['Jazz', 'Rock n Roll'])
+        jazz = Genre.query.filter_by(name='Jazz').one()
+        self.assertEqual(len(jazz.artists), 2)
+
+    def test_artists_can_be_filtered_by_genre(self):
+        self.add_artist('Guns N Petals', ['Rock n Roll'])
+        self.add_artist('The Wild Sax Band', ['Jazz'])
+        response = self.client.get('/artists?genre=Jazz')
+        self.assertIn(b'The Wild Sax Band', response.data)
+        self.assertNotIn(b'Guns N Petals', response.data)
+        response = self.client.post('/artists/search?genre=Rock n Roll',
+                                    data={'search_term': ''})
+        self.assertIn(b'/artists/1"', response.data)
+        self.assertNotIn(b'/artists/2"', response.data)
+
+    def test_area_totals_count_only_venues_of_the_genre(self):
+        soon = datetime.now() + timedelta(days=1)
+        self.add_shows(2, start=soon, venue=Venue(
+            name='The Musical Hop', city='San Francisco', state='CA',
+            genres=Genre.from_names(['Jazz'])))
+        self.add_shows(3, start=soon, venue=Venue(
+            name='Park Square Live', city='San Francisco', state='CA',
+            genres=Genre.from_names(['Rock n Roll'])))
+        response = self.client.get('/venues?genre=Jazz')
+        self.assertIn(b'<small>2 upcoming shows</small>', response.data)
+        self.assertNotIn(b'Park Square Live', response.data)
+        response = self.client.get('/venues')
+        self.assertIn(b'<small>5 upcoming shows</small>', response.data)
+
+    def test_edit_replaces_genres(self):
+        self.add_artist('Guns N Petals', ['Rock n Roll'])
+        response = self.client.get('/artists/1/edit')
+        self.assertTrue(b'<option selected value="Rock n Roll">'
+                        in response.data)
+        self.client.post('/artists/1/edit', data={
+            'name': 'Guns N Petals', 'city': 'San Francisco', 'state': 'CA',
+            'genres': ['Jazz', 'Blues'], 'facebook_link': 'http://fb.com/g'})
+        artist = Artist.query.get(1)
+        self.assertEqual([g.name for g in artist.genres], ['Blues', 'Jazz'])
+        response = self.client.get('/artists/1')
+        self.assertIn(b'<span class="genre">Blues</span>', response.data)
+
+
+class ImportCase(FyyurTestCase):
+    def write(self, suffix, content):
+        f = tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False)
+        self.addCleanup(os.remove, f.name)
+        with f:
+            f.write(content)
+        return f.name
+
+    def test_artists_and_shows_are_imported_in_chunks(self):
+        artists = self.write('.csv', (
+            'id,name,city,state,genres,facebook_link,seeking_venue\n'
+            '7,Guns N Petals,San Francisco,CA,"Rock n Roll,Jazz",'
+            'http://fb.com/g,false\n'
+            '8,,San Francisco,CA,Jazz,http://fb.com/x,true\n'
+            '9,The Wild Sax Band,San Francisco,CA,Jazz,http://fb.com/w,y\n'))
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['import', 'artists', artists,
+                                     '--chunk-size', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Imported 2 of 3 artists', result.output)
+        self.assertIn('line 3: name: This field is required.', result.output)
+        artist = Artist.query.get(7)
+        self.assertEqual([g.name for g in artist.genres],
+                         ['Jazz', 'Rock n Roll'])
+        self.assertFalse(artist.seeking_venue)
+        self.assertEqual(Genre.query.count(), 2)
+        response = self.client.post('/artists/search',
+                                    data={'search_term': 'sax'})
+        self.assertIn(b'/artists/9"', response.data)
+
+        self.add_shows(0, venue=Venue(name='The Musical Hop'))
+        shows = self.write('.jsonl', (
+            '{"artist_id": 7, "venue_id": 1, '
+            '"start_time": "2035-04-01 20:00:00"}\n'
+            '{"artist_id": 99, "venue_id": 1, '
+            '"start_time": "2035-04-01 20:00:00"}\n'
+            'not json\n'))
+        result = runner.invoke(args=['import', 'shows', shows])
+        self.assertIn('Imported 1 of 3 shows', result.output)
+        self.assertIn('line 2: artist_id: No artist 99.', result.output)
+        self.assertEqual(Show.query.one().artist_id, 7)
+
+    def test_rows_without_ids_are_inserted_in_one_statement(self):
+        self.add_shows(0)
+        venues = self.write('.csv', 'name,city,state,genres,facebook_link\n' + ''.join(
+            f'Hall {i},Austin,TX,Jazz,http://fb.com/{i}\n'
+            for i in range(5)))
+        with count_queries() as statements:
+            result = app.test_cli_runner().invoke(
+                args=['import', 'venues', venues])
+        self.assertIn('Imported 5 of 5 venues', result.output)
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith('INSERT INTO "Venue"')]),
+                         1)
+        self.assertEqual(
+            [(venue.id, [genre.name for genre in venue.genres])
+             for venue in Venue.query.order_by(Venue.id)],
+            [(1, [])] + [(id, ['Jazz']) for id in range(2, 7)])
+        response = self.client.post('/venues/search',
+                                    data={'search_term': 'hall'})
+        self.assertIn(b'/venues/6"', response.data)
+
+
+class ExportCase(FyyurTestCase):
+    def test_shows_csv_is_streamed_and_filtered_by_date(self):
+        self.add_shows(3, start=datetime(2030, 1, 1, 20, 0))
+        response = self.client.get(
+            '/export/shows.csv?from=2030-01-02&to=2030-01-03')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertEqual(response.get_data(as_text=True).splitlines(), [
+            'id,artist_id,artist_name,venue_id,venue_name,start_time',
+            '2,1,The Wild Sax Band,1,The Musical Hop,2030-01-02 20:00:00'])
+        self.assertEqual(
+            self.client.get('/export/shows.csv?from=soon').status_code, 400)
+        self.assertEqual(self.client.get('/export/shows.xml').status_code,
+                         404)
+
+    def test_artists_jsonl_round_trips_through_import(self):
+        artist = Artist(name='Guns N Petals', city='San Francisco',
+                        state='CA', facebook_link='http://fb.com/g',
+                        genres=Genre.from_names(['Rock n Roll', 'Jazz']))
+        self.add_shows(1, artist=artist)
+        result = app.test_cli_runner().invoke(args=['export', 'artists'])
+        (values,) = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual(values['genres'], ['Jazz', 'Rock n Roll'])
+        self.assertEqual(values['name'], 'Guns N Petals')
+        response = self.client.get('/export/artists.jsonl?from=2031-01-01')
+        self.assertEqual(response.data, b'')
+
+        db.session.delete(Show.query.one())
+        db.session.delete(artist)
+        db.session.commit()
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as f:
+            f.write(result.output)
+            f.flush()
+            app.test_cli_runner().invoke(args=['import', 'artists', f.name])
+        self.assertEqual([g.name for g in Artist.query.get(1).genres],
+                         ['Jazz', 'Rock n Roll'])
+
+
+class ApiCase(FyyurTestCase):
+    def test_fields_and_cursor_pagination(self):
+        for name in ('A', 'B', 'C'):
+            db.session.add(
+                Artist(name=name, genres=Genre.from_names(['Jazz'])))
+        db.session.commit()
+        response = self.client.get(
+            '/api/v1/artists?fields=name,genres&per_page=2')
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertNotIn(b' ', response.data)
+        body = json.loads(response.data)
+        self.assertEqual(body['data'], [{'name': 'A', 'genres': ['Jazz']},
+                                        {'name': 'B', 'genres': ['Jazz']}])
+        self.assertIsNone(body['prev'])
+        body = json.loads(self.client.get(body['next']).data)
+        self.assertEqual(body['data'], [{'name': 'C', 'genres': ['Jazz']}])
+
+    def test_embeds_are_loaded_in_batches(self):
+        self.add_shows(5)
+        self.add_shows(5, start=datetime(2040, 1, 1))
+        with count_queries() as statements:
+            response = self.client.get(
+                '/api/v1/shows?embed=artist,venue&fields=id')
+        # the page, then one query per embedded relation
+        self.assertEqual(len(statements), 3)
+        data = json.loads(response.data)['data']
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data[0]['venue']['name'], 'The Musical Hop')
+        response = self.client.get('/api/v1/artists/2?embed=upcoming_shows')
+        shows = json.loads(response.data)['data']['upcoming_shows']
+        self.assertEqual([show['id'] for show in shows], list(range(6, 11)))
+
+    def test_errors_are_json(self):
+        response = self.client.get('/api/v1/venues?fields=id,nope')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(json.loads(response.data),
+                         {'error': 'unknown fields: nope'})
+        response = self.client.get('/api/v1/shows/1')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn('error', json.loads(response.data))
+
+
+class SeedCase(FyyurTestCase):
+    def test_seed_is_deterministic(self):
+        now = datetime(2020, 6, 1)
+        seed(30, 5, 200, seed=3, now=now)
+        first = [(a.name, [g.name for g in a.genres]) for a in Artist.query]
+        shows = db.session.query(Show.artist_id, Show.start_time).all()
+        self.assertEqual((len(first), Venue.query.count(), len(shows)),
+                         (30, 5, 200))
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        seed(30, 5, 200, seed=3, now=now)
+        self.assertEqual(
+            [(a.name, [g.name for g in a.genres]) for a in Artist.query],
+            first)
+        self.assertEqual(
+            db.session.query(Show.artist_id, Show.start_time).all(), shows)
+        response = self.client.post('/artists/search',
+                                    data={'search_term': first[0][0]})
+        self.assertIn(b'/artists/1"', response.data)
+
+    def test_seed_command_refuses_a_populated_database(self):
+        self.add_shows(1)
+        result = app.test_cli_runner().invoke(args=['seed'])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn('not empty', result.output)
+
+
+class MetricsCase(FyyurTestCase):
+    def test_server_timing_counts_queries(self):
+        self.add_shows(3)
+        response = self.client.get('/artists/1')
+        timing = response.headers['Server-Timing']
+        self.assertIn('desc="4 queries"', timing)
+        self.assertIn('render;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_requests_are_logged_and_aggregated(self):
+        self.add_shows(1)
+        with self.assertLogs(app.logger, 'INFO') as logs:
+            self.client.get('/shows')
+        (line,) = [json.loads(record.getMessage()) for record in logs.records
+                   if record.getMessage().startswith('{')]
+        self.assertEqual((line['endpoint'], line['status'], line['queries']),
+                         ('shows', 200, 2))
+        self.assertTrue(line['slowest'].startswith('SELECT'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.mimetype, 'text/plain')
+        text = response.get_data(as_text=True)
+        self.assertIn('# TYPE fyyur_request_duration_seconds histogram', text)
+        self.assertRegex(text, r'fyyur_requests_total\{endpoint="shows",'
+                               r'method="GET",status="200"\} \d+')
+        self.assertRegex(text, r'fyyur_db_queries_per_request_bucket\{'
+                               r'endpoint="shows",le="2"\} \d+')
+
+
+class ProfilerCase(FyyurTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        app.config.update(PROFILE_DIR=self.directory, PROFILE_MAX_FILES=2)
+        self.addCleanup(app.config.update, PROFILE_DIR=None,
+                        PROFILE_SAMPLE_RATE=0.0, PROFILE_SLOW_MS=None,
+                        PROFILE_MAX_FILES=200)
+
+    def test_sampled_requests_are_dumped_to_a_bounded_directory(self):
+        self.client.get('/artists')
+        self.assertEqual(os.listdir(self.directory), [])
+        app.config['PROFILE_SAMPLE_RATE'] = 1.0
+        for _ in range(3):
+            self.client.get('/artists')
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(name.startswith('artists.') for name in names))
+        result = app.test_cli_runner().invoke(
+            args=['profile', 'summarize', '--limit', '5'])
+        self.assertIn('2 profiles: artists 2', result.output)
+        self.assertIn('function calls', result.output)
+
+    def test_slow_requests_are_kept(self):
+        app.config['PROFILE_SLOW_MS'] = 10 ** 6
+        self.client.get('/shows')
+        self.assertEqual(os.listdir(self.directory), [])
+        app.config['PROFILE_SLOW_MS'] = 0
+        self.client.get('/shows')
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+
+class CounterCase(FyyurTestCase):
+    def counters(self, obj):
+        db.session.refresh(obj)
+        return (obj.upcoming_shows_count, obj.past_shows_count,
+                obj.next_show_at)
+
+    def test_counters_follow_show_writes(self):
+        soon = datetime.now() + timedelta(days=1)
+        artist, venue = self.add_shows(2, start=datetime(2019, 5, 21))
+        self.assertEqual(self.counters(artist), (0, 2, None))
+        db.session.add_all([
+            Show(artist_id=artist.id, venue_id=venue.id, start_time=soon),
+            Show(artist_id=artist.id, venue_id=venue.id,
+                 start_time=soon + timedelta(days=7))])
+        db.session.commit()
+        self.assertEqual(self.counters(artist), (2, 2, soon))
+        self.assertEqual(self.counters(venue), (2, 2, soon))
+
+        first = Show.query.filter_by(start_time=soon).one()
+        first.start_time = datetime(2019, 1, 1)
+        db.session.commit()
+        self.assertEqual(self.counters(artist),
+                         (1, 3, soon + timedelta(days=7)))
+        db.session.delete(Show.query.filter(
+            Show.start_time > datetime.now()).one())
+        db.session.commit()
+        self.assertEqual(self.counters(venue), (0, 3, None))
+
+    def test_roll_forward(self):
+        soon = datetime.now() + timedelta(hours=1)
+        artist, venue = self.add_shows(3, start=soon)
+        with db.engine.begin() as connection:
+            self.assertEqual(counters.roll_forward(connection), 0)
+            later = soon + timedelta(days=1, minutes=1)
+            self.assertEqual(counters.roll_forward(connection, now=later), 2)
+        self.assertEqual(self.counters(artist),
+                         (1, 2, soon + timedelta(days=2)))
+
+    def test_reconcile(self):
+        artist, venue = self.add_shows(3)
+        db.engine.execute(Artist.__table__.update().values(
+            upcoming_shows_count=7))
+        runner = app.test_cli_runner()
+        result = runner.invoke(args=['counters', 'reconcile'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('Artist 1: stored (7, 3, None), actual (0, 3, None)',
+                      result.output)
+        self.assertNotIn('Venue', result.output)
+        result = runner.invoke(args=['counters', 'reconcile', '--fix'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn('warning: with CACHE_TYPE=memory', result.output)
+        self.assertEqual(self.counters(Artist.query.get(1)), (0, 3, None))
+        result = runner.invoke(args=['counters', 'reconcile'])
+        self.assertEqual(result.exit_code, 0)
+        self.assertNotIn('warning', result.output)
+
+    def test_cli_writes_clear_a_shared_cache_without_warning(self):
+        self.add_shows(1)
+        db.engine.execute(Artist.__table__.update().values(
+            upcoming_shows_count=7))
+        with tempfile.TemporaryDirectory() as directory:
+            app.config.update(CACHE_TYPE='filesystem', CACHE_DIR=directory)
+            try:
+                cache.init_app(app)
+                self.client.get('/artists')
+                self.assertTrue(os.listdir(directory))
+                result = app.test_cli_runner().invoke(
+                    args=['counters', 'reconcile', '--fix'])
+                self.assertEqual(result.exit_code, 0)
+                self.assertNotIn('warning', result.output)
+                self.assertFalse(os.listdir(directory))
+            finally:
+                app.config.update(CACHE_TYPE='memory', CACHE_DIR=None)
+                cache.init_app(app)
+
+    def test_listings_read_the_counters(self):
+        self.add_shows(2, start=datetime.now() + timedelta(days=1))
+        with count_queries() as statements:
+            response = self.client.get('/venues')
+            self.client.post('/artists/search', data={'search_term': 'sax'})
+        self.assertIn(b'2 upcoming shows', response.data)
+        self.assertFalse([s for s in statements if '"Show"' in s])
+
+
+class CalendarCase(FyyurTestCase):
+    def test_shows_filters(self):
+        artist, venue = self.add_shows(5, start=datetime(2030, 1, 1, 20, 0))
+        other = Venue(name='Park Square', city='Oakland', state='CA')
+        db.session.add(other)
+        db.session.flush()
+        db.session.add(Show(artist_id=artist.id, venue_id=other.id,
+                            start_time=datetime(2030, 1, 2, 18, 0)))
+        db.session.commit()
+        artist_id, venue_id, other_id = artist.id, venue.id, other.id
+
+        def shows(query):
+            response = self.client.get('/shows?' + query)
+            self.assertEqual(response.status_code, 200)
+            return response.data.count(b'tile-show')
+        self.assertEqual(shows('from=2030-01-02&to=2030-01-04'), 3)
+        self.assertEqual(shows(f'from=2030-01-02&venue_id={venue_id}'), 4)
+        self.assertEqual(shows('city=Oakland'), 1)
+        self.assertEqual(shows(f'artist_id={artist_id}&to=2030-01-01'), 0)
+        self.assertEqual(self.client.get('/shows?from=soon').status_code,
+                         400)
+        self.assertEqual(self.client.get('/shows?venue_id=x').status_code,
+                         400)
+        response = self.client.get('/api/v1/shows?city=Oakland')
+        self.assertEqual([show['venue_id'] for show in response.json['data']],
+                         [other_id])
+
+    def test_month_view(self):
+        self.add_shows(3, start=datetime(2030, 1, 30, 20, 0))
+        response = self.client.get('/shows/calendar/2030/1')
+        self.assertIn(b'January 2030', response.data)
+        self.assertIn(b'Wednesday, January 30', response.data)
+        self.assertIn(b'Thursday, January 31', response.data)
+        self.assertNotIn(b'February 1', response.data)
+        self.assertIn(b'/shows/calendar/2030/2', response.data)
+        self.assertIn(b'/shows/calendar/2029/12', response.data)
+        self.assertEqual(
+            self.client.get('/shows/calendar/2030/13').status_code, 404)
+        self.assertEqual(self.client.get('/shows/calendar').status_code, 302)
+
+    def test_month_view_shows_the_whole_month(self):
+        artist, venue = self.add_shows(31, start=datetime(2030, 1, 1, 20, 0))
+        self.add_shows(31, artist=artist, venue=venue,
+                       start=datetime(2030, 1, 1, 23, 30))
+        response = self.client.get('/shows/calendar/2030/1?per_page=5')
+        self.assertEqual(response.data.count(b'The Wild Sax Band at'), 62)
+        self.assertIn(b'Thursday, January 31', response.data)
+        self.assertNotIn(b'after=', response.data)
+
+    def test_ics_feed(self):
+        venue = Venue(name='The Hop; Main Room', city='San Francisco',
+                      state='CA', address='1015 Folsom Street')
+        artist, venue = self.add_shows(
+            2, venue=venue, start=datetime(2030, 1, 1, 20, 30))
+        artist_id, venue_id = artist.id, venue.id
+        response = self.client.get(f'/venues/{venue_id}/shows.ics')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'text/calendar')
+        body = response.get_data(as_text=True)
+        lines = body.split('\r\n')
+        self.assertEqual(lines[0], 'BEGIN:VCALENDAR')
+        self.assertEqual(lines[-2:], ['END:VCALENDAR', ''])
+        self.assertEqual(lines.count('BEGIN:VEVENT'), 2)
+        self.assertIn('DTSTART:20300102T203000', lines)
+        self.assertIn('SUMMARY:The Wild Sax Band at The Hop\\; Main Room',
+                      lines)
+        self.assertTrue(all(len(line.encode()) <= 75 for line in lines))
+        self.assertIn('LOCATION:The Hop\\; Main Room\\, 1015 Folsom Street'
+                      '\\, San Francisco\\, CA', body.replace('\r\n ', ''))
+
+        response = self.client.get(
+            f'/artists/{artist_id}/shows.ics?from=2030-01-02')
+        self.assertEqual(response.get_data(as_text=True).count('VEVENT'), 2)
+        self.assertEqual(self.client.get('/artists/9/shows.ics').status_code,
+                         404)
+
+    def test_fold(self):
+        from app.ical import fold
+        line = 'SUMMARY:' + '\u00e9' * 80
+        folded = fold(line)
+        pieces = folded[:-2].split('\r\n ')
+        self.assertTrue(all(len(piece.encode()) <= 74 for piece in pieces))
+        self.assertEqual(''.join(pieces), line)
+
+
+class DatabaseCase(FyyurTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        app.config['SQLALCHEMY_BINDS'] = {
+            'replica': 'sqlite:///' + os.path.join(self.directory.name,
+                                                   'replica.db')}
+        self.replica = db.get_engine(app, bind='replica')
+        db.Model.metadata.create_all(self.replica)
+
+    def tearDown(self):
+        super().tearDown()
+        app.config['SQLALCHEMY_BINDS'] = None
+        self.replica.dispose()
+        self.directory.cleanup()
+
+    def test_get_requests_read_from_the_replica(self):
+        self.replica.execute(Artist.__table__.insert().values(
+            name='Replica Band'))
+        self.assertIn(b'Replica Band', self.client.get('/artists').data)
+        self.assertEqual(Artist.query.count(), 0)
+
+        self.client.post('/artists/create', data={
+            'name': 'Primary Band', 'city': 'Austin', 'state': 'TX',
+            'genres': ['Jazz'], 'phone': '555-0100',
+            'facebook_link': 'https://www.facebook.com/primary'},
+            follow_redirects=True)
+        self.assertEqual(Artist.query.count(), 1)
+        # another visitor caches the page as the lagging replica has it
+        other = app.test_client()
+        self.assertNotIn(b'Primary Band', other.get('/artists').data)
+        # the writer reads its own write, past the cache, until the pin
+        # runs out
+        response = self.client.get('/artists')
+        self.assertIn(b'Primary Band', response.data)
+        self.assertNotIn('X-Cache', response.headers)
+        with self.client.session_transaction() as session:
+            session['read_primary_until'] = 0
+        response = self.client.get('/artists')
+        self.assertIn(b'Replica Band', response.data)
+        self.assertEqual(response.headers['X-Cache'], 'HIT')
+
+    def test_engine_options(self):
+        options = {}
+        app.config['DATABASE_STATEMENT_TIMEOUT_MS'] = 2000
+        try:
+            db.apply_driver_hacks(
+                app, make_url('postgresql://localhost/fyyur'), options)
+        finally:
+            app.config['DATABASE_STATEMENT_TIMEOUT_MS'] = None
+        self.assertEqual(options['pool_size'], 5)
+        self.assertEqual(options['pool_recycle'], 1800)
+        self.assertTrue(options['pool_pre_ping'])
+        self.assertEqual(options['connect_args'],
+                         {'options': '-c statement_timeout=2000'})
+        options = {}
+        db.apply_driver_hacks(app, make_url('sqlite:///fyyur.db'), options)
+        self.assertNotIn('pool_size', options)
+
+    def test_statement_timeout_on_sqlite(self):
+        app.config['DATABASE_STATEMENT_TIMEOUT_MS'] = 50
+        try:
+            engine = db.create_engine(make_url('sqlite://'), {})
+        finally:
+            app.config['DATABASE_STATEMENT_TIMEOUT_MS'] = None
+        with self.assertRaises(OperationalError):
+            engine.execute('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL '
+                           'SELECT i + 1 FROM n WHERE i < 100000000) '
+                           'SELECT count(*) FROM n')
+        self.assertEqual(engine.execute('SELECT 1').scalar(), 1)
+
+
+class StartupCase(FyyurTestCase):
+    def test_precompile_fills_the_bytecode_cache(self):
+        bytecode_cache = app.jinja_env.bytecode_cache
+        with tempfile.TemporaryDirectory() as directory:
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+            app.jinja_env.cache.clear()
+            try:
+                result = app.test_cli_runner().invoke(args=['precompile'])
+            finally:
+                app.jinja_env.bytecode_cache = bytecode_cache
+            names = app.jinja_env.list_templates(extensions=['html'])
+            self.assertIn(f'Compiled {len(names)} templates', result.output)
+            self.assertEqual(len(os.listdir(directory)), len(names))
+
+    def test_import_skips_what_requests_load_on_demand(self):
+        code = ('import sys, fyyur; print(",".join(name for name in '
+                '("babel", "dateutil", "wtforms", "alembic") '
+                'if name in sys.modules) or "none")')
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [sys.executable, '-c', code], cwd=directory,
+                env=dict(os.environ, PYTHONPATH=os.path.dirname(
+                    os.path.abspath(__file__)),
+                    DATABASE_URL='sqlite://'),
+                stdout=subprocess.PIPE, check=True).stdout
+        self.assertEqual(output.decode().split()[-1], 'none')
+
+
+class AssetsCase(FyyurTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static_folder = app.static_folder
+        self.directory = tempfile.TemporaryDirectory()
+        app.static_folder = os.path.join(self.directory.name, 'static')
+        shutil.copytree(self.static_folder, app.static_folder,
+                        ignore=shutil.ignore_patterns('dist'))
+
+    def tearDown(self):
+        app.static_folder = self.static_folder
+        assets.load()
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_pages_use_sources_until_built(self):
+        assets.load()
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertIn('/static/css/main.quickfix.css', page)
+        self.assertNotIn('/static/dist/', page)
+
+        result = app.test_cli_runner().invoke(args=['assets', 'build'])
+        self.assertIn('Built', result.output)
+        cache.clear()
+        page = self.client.get('/').get_data(as_text=True)
+        self.assertNotIn('/static/css/', page)
+        (css,) = re.findall(r'/static/(dist/main\.\w{12}\.css)', page)
+        with app.test_request_context():
+            self.assertEqual(assets.url('main.css'), '/static/' + css)
+
+        response = self.client.get('/static/' + css, headers={
+            'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertEqual(response.headers['Cache-Control'],
+                         'public, max-age=31536000, immutable')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        text = gzip.decompress(response.data).decode()
+        self.assertIn('.tile-show', text)
+        self.assertNotIn('/*', text.split('*/')[-1])
+        response = self.client.get('/static/' + css)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(response.get_data(as_text=True), text)
+        response = self.client.get('/static/css/main.css')
+        self.assertNotIn('immutable', response.headers['Cache-Control'])
+
+    def test_clean_keeps_the_current_build(self):
+        old = build(app.static_folder)
+        with open(os.path.join(app.static_folder, 'css', 'main.css'),
+                  'a') as f:
+            f.write('.new { color: red; }\n')
+        manifest = build(app.static_folder)
+        # the bundle and css/main.css itself, each with its gzip copy
+        stale = set(old['files'].values()) - set(manifest['files'].values())
+        self.assertEqual(len(stale), 2)
+        self.assertEqual(clean(app.static_folder, manifest), 4)
+        for path in manifest['files'].values():
+            self.assertTrue(os.path.exists(
+                os.path.join(app.static_folder, path)))
+
+    def test_minify_css(self):
+        self.assertEqual(minify_css(
+            '/* note */\n@media screen and (max-width: 10px) {\n'
+            '  a :hover , b > c { margin: 0 ; content: "a ; b" }\n}'),
+            '@media screen and (max-width:10px){a :hover,b>c{margin:0;'
+            'content:"a ; b"}}')
+
+
+class CompressionCase(FyyurTestCase):
+    GZIP = {'Accept-Encoding': 'gzip, deflate'}
+
+    def tearDown(self):
+        app.config['COMPRESS_MIN_SIZE'] = 500
+        super().tearDown()
+
+    def test_pages_are_gzipped_for_clients_that_accept_it(self):
+        self.add_shows(3)
+        plain = self.client.get('/artists/1')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+        response = self.client.get('/artists/1', headers=self.GZIP)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response.headers['Content-Length']),
+                         len(response.data))
+        self.assertLess(len(response.data), len(plain.data))
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+
+        app.config['COMPRESS_MIN_SIZE'] = 100
+        api = self.client.get('/api/v1/shows?embed=artist,venue',
+                              headers=self.GZIP)
+        self.assertEqual(api.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(api.data))['data']),
+                         3)
+
+    def test_small_and_unlisted_responses_are_left_alone(self):
+        app.config['COMPRESS_MIN_SIZE'] = 10 ** 6
+        response = self.client.get('/', headers=self.GZIP)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn(b'<!doctype html>', response.data)
+        response = self.client.get('/static/img/front-splash.jpg',
+                                   headers=self.GZIP)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_streamed_export_is_gzipped_as_it_goes(self):
+        self.add_shows(3, start=datetime(2030, 1, 1, 20, 0))
+        response = self.client.get('/export/shows.csv', headers=self.GZIP)
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[1].endswith('2030-01-01 20:00:00'))
+
+    def test_compressed_page_still_answers_conditional_requests(self):
+        self.add_shows(3)
+        app.config['COMPRESS_MIN_SIZE'] = 100
+        for path in ('/artists/1', '/venues/1', '/shows'):
+            response = self.client.get(path, headers=self.GZIP)
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            etag = response.headers['ETag']
+            self.assertTrue(etag.startswith('W/'))
+            response = self.client.get(path, headers=dict(
+                self.GZIP, **{'If-None-Match': etag}))
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.headers['ETag'], etag, path)
+            self.assertNotIn('Content-Encoding', response.headers)
+
+
+class LoggingCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'logs', 'test.log')
+        self.app = Flask('logging_test')
+        self.app.config.update(LOG_FILE=self.path, LOG_MAX_BYTES=2000,
+                               LOG_BACKUP_COUNT=2)
+        self.logs = RequestLogging(self.app)
+
+        @self.app.route('/')
+        def index():
+            self.app.logger.info('hello %s', 'there')
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                self.app.logger.exception('failed')
+            return 'ok'
+
+    def tearDown(self):
+        self.logs.stop()
+        self.directory.cleanup()
+
+    def lines(self):
+        self.logs.stop()
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_lines_are_json_with_the_request_id(self):
+        client = self.app.test_client()
+        response = client.get('/', headers={'X-Request-ID': 'abc-123'})
+        self.assertEqual(response.headers['X-Request-ID'], 'abc-123')
+        generated = client.get('/', headers={'X-Request-ID': 'a b;c'})
+        request_id = generated.headers['X-Request-ID']
+        self.assertRegex(request_id, r'^[0-9a-f]{32}$')
+        self.app.logger.warning('{"event": "startup", "workers": 2}')
+
+        hello, failed, other, _, startup = self.lines()
+        self.assertEqual((hello['message'], hello['level'],
+                          hello['request_id']), ('hello there', 'INFO',
+                                                 'abc-123'))
+        self.assertIn('ZeroDivisionError', failed['exception'])
+        self.assertEqual(other['request_id'], request_id)
+        self.assertEqual((startup['event'], startup['workers'],
+                          startup['request_id']), ('startup', 2, None))
+
+    def test_files_are_rotated(self):
+        for i in range(100):
+            self.app.logger.info('line %d', i)
+        self.lines()
+        self.assertEqual(sorted(os.listdir(os.path.dirname(self.path))),
+                         ['test.log', 'test.log.1', 'test.log.2'])
+
+
+class ScheduleCase(FyyurTestCase):
+    def test_occurrences(self):
+        start = datetime(2030, 1, 31, 20, 0)
+        self.assertEqual(occurrences(start), [start])
+        self.assertEqual(
+            occurrences(start, 'weekly', start.date() + timedelta(days=14)),
+            [start, start + timedelta(days=7), start + timedelta(days=14)])
+        self.assertEqual(
+            [time.day for time in occurrences(
+                start, 'monthly', datetime(2030, 4, 30).date())],
+            [31, 28, 31, 30])
+        self.assertEqual(len(occurrences(
+            start, 'weekly', datetime(2030, 12, 31).date(), interval=2)), 24)
+        with self.assertRaises(ScheduleError):
+            occurrences(start, 'weekly', None)
+        with self.assertRaises(ScheduleError):
+            occurrences(start, 'daily', datetime(2031, 1, 1).date())
+        with self.assertRaises(ScheduleError):
+            occurrences(start, 'weekly', datetime(2040, 1, 1).date())
+
+    def test_batch_books_every_show_in_one_insert(self):
+        artist, venue = self.add_shows(0)
+        artist_id, venue_id = artist.id, venue.id
+        rule = {'artist_id': artist_id, 'venue_id': venue_id,
+                'start_time': '2030-01-04 21:00:00', 'repeat': 'weekly',
+                'repeat_until': '2030-03-29'}
+        with count_queries() as statements:
+            response = self.client.post('/shows/batch', json=rule)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.get_json()['created'], 13)
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith('INSERT')]), 1)
+        self.assertEqual(len([statement for statement in statements
+                              if statement.startswith('SELECT') and
+                              'FROM "Show"' in statement]), 1)
+        self.assertEqual(Show.query.count(), 13)
+        venue = Venue.query.get(venue_id)
+        self.assertEqual((venue.upcoming_shows_count, venue.next_show_at),
+                         (13, datetime(2030, 1, 4, 21, 0)))
+        self.assertIn(b'2030', self.client.get('/shows').data)
+
+    def test_double_booking_books_nothing(self):
+        artist, venue = self.add_shows(1, start=datetime(2030, 2, 1, 20, 0))
+        artist_id, venue_id = artist.id, venue.id
+        with count_queries() as statements:
+            response = self.client.post('/shows/batch', json={
+                'artist_id': artist_id, 'venue_id': venue_id,
+                'start_time': '2030-01-04 21:00:00', 'repeat': 'weekly',
+                'repeat_until': '2030-03-29'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(statements), 3)
+        (conflict,) = response.get_json()['conflicts']
+        self.assertEqual(conflict['start_time'], '2030-02-01T20:00:00')
+        self.assertEqual(Show.query.count(), 1)
+        self.assertEqual(Venue.query.get(venue_id).upcoming_shows_count, 1)
+
+        self.assertEqual(self.client.post('/shows/batch', json={
+            'artist_id': 9, 'venue_id': venue_id,
+            'start_time': '2030-01-04 21:00:00'}).status_code, 400)
+
+    def test_venue_is_locked_before_the_clash_check(self):
+        artist, venue = self.add_shows(0)
+        artist_id, venue_id = artist.id, venue.id
+        with count_queries() as statements:
+            response = self.client.post('/shows/batch', json={
+                'artist_id': artist_id, 'venue_id': venue_id,
+                'start_time': '2030-01-04 21:00:00'})
+        self.assertEqual(response.status_code, 201)
+        lock = next(i for i, statement in enumerate(statements)
+                    if statement.startswith('UPDATE "Venue"'))
+        check = next(i for i, statement in enumerate(statements)
+                     if statement.startswith('SELECT') and
+                     'FROM "Show"' in statement)
+        self.assertLess(lock, check)
+        self.assertEqual(self.client.post('/shows/batch', json={
+            'artist_id': artist_id, 'venue_id': 9,
+            'start_time': '2030-01-04 21:00:00'}).status_code, 400)
+
+    def test_create_page_books_a_monthly_residency(self):
+        artist, venue = self.add_shows(0)
+        response = self.client.post('/shows/create', data={
+            'artist_id': artist.id, 'venue_id': venue.id,
+            'start_time': '2030-01-15 20:00:00', 'repeat': 'monthly',
+            'interval': '2', 'repeat_until': '2030-12-31'},
+            follow_redirects=True)
+        self.assertIn(b'6 shows were successfully listed!', response.data)
+        self.assertEqual(
+            [show.start_time.month for show in Show.query.order_by(
+                Show.start_time)], [1, 3, 5, 7, 9, 11])
+
+
+class PaginationCase(FyyurTestCase):
+    def test_shows_are_paged_forwards_and_backwards(self):
+        self.add_shows(5)
+        app.config['PER_PAGE'] = 2
+        self.addCleanup(app.config.__setitem__, 'PER_PAGE', 20)
+        with app.test_request_context('/shows'):
+            first = keyset_paginate(Show.query, [Show.start_time, Show.id])
+        self.assertEqual([s.id for s in first.items], [1, 2])
+        self.assertFalse(first.has_prev)
+        with app.test_request_context('/shows?after=' + first.next_cursor):
+            second = keyset_paginate(Show.query, [Show.start_time, Show.id])
+        self.assertEqual([s.id for s in second.items], [3, 4])
+        with app.test_request_context('/shows?before=' + second.prev_cursor):
+            back = keyset_paginate(Show.query, [Show.start_time, Show.id])
+        self.assertEqual([s.id for s in back.items], [1, 2])
+        self.assertFalse(back.has_prev)
+
+    def test_per_page_is_capped(self):
+        db.session.add_all([Artist(name='artist %d' % i) for i in range(150)])
+        db.session.commit()
+        response = self.client.get('/artists?per_page=1000')
+        self.assertEqual(response.data.count(b'<h5>'), 100)
+        self.assertIn(b'?after=', response.data)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get('/venues?after=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_venues_are_paged_across_missing_areas(self):
+        db.session.add_all([
+            Venue(name='Nowhere', city=None, state=None),
+            Venue(name='No State', city='Austin', state=None),
+            Venue(name='Hop', city='Austin', state='TX'),
+            Venue(name='Blank', city='', state='')])
+        db.session.commit()
+        app.config['PER_PAGE'] = 1
+        self.addCleanup(app.config.__setitem__, 'PER_PAGE', 20)
+        names, path = [], '/venues'
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            page = response.get_data(as_text=True)
+            names += re.findall(r'<h5>([^<]+)</h5>', page)
+            path = (re.findall(r'href="(/venues\?after=[^"]+)"', page) or
+                    [None])[0]
+        self.assertEqual(names, ['Nowhere', 'Blank', 'No State', 'Hop'])
+
+    def test_venues_are_paged_along_the_listing_index(self):
+        db.session.add(Venue(name='Hop', city='Austin', state='TX'))
+        db.session.commit()
+        selects = []
+
+        def record(conn, cursor, statement, parameters, *args):
+            if statement.lstrip().startswith('SELECT'):
+                selects.append((statement, parameters))
+
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            cursor = encode_cursor(['Austin', '', 0])
+            self.client.get(f'/venues?after={cursor}')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        statement, parameters = selects[0]
+        plan = ' '.join(row[-1] for row in db.session.connection(
+        ).connection.cursor().execute(
+            'EXPLAIN QUERY PLAN ' + statement, parameters))
+        self.assertIn('USING INDEX ix_Venue_listing', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_cursor_of_the_wrong_types_is_rejected(self):
+        for path, values in (('/shows', [1, 2]), ('/artists', [{'a': 1}]),
+                             ('/artists', [True]), ('/artists', [None]),
+                             ('/venues', ['Austin', 'TX', '1']),
+                             ('/api/v1/shows', ['2030-01-01', 'x'])):
+            response = self.client.get(
+                f'{path}?after={encode_cursor(values)}')
+            self.assertEqual(response.status_code, 400, (path, values))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)